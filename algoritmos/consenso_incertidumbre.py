@@ -2,9 +2,11 @@
 Algoritmo 2: Asignación basada en Consenso Distribuido con Incertidumbre
 Algoritmo distribuido para asignación de tareas en entornos con incertidumbre.
 """
-from typing import Dict
-from utils.tarea import EstadoTarea
+from typing import Dict, List, Set, Tuple
+import numpy as np
+from utils.tarea import Tarea, EstadoTarea, ESTADO_PENDIENTE, ESTADO_ASIGNADA
 from utils.entorno import Entorno
+from utils.mascaras import mascara_de, primer_bit, iterar_bits
 
 
 class AlgoritmoConsensoIncertidumbre:
@@ -15,43 +17,94 @@ class AlgoritmoConsensoIncertidumbre:
     
     def __init__(self, 
                  entorno: Entorno,
-                 epsilon: float = 0.2,
                  lambda_penalizacion: float = 0.3,
-                 iteraciones_consenso: int = 5,
+                 iteraciones_consenso: int = 3,
                  sigma_umbral: float = 2.0):
         """
         Inicializa el algoritmo.
         
         Args:
             entorno: Entorno de simulación
-            epsilon: Parámetro de paso para el consenso
             lambda_penalizacion: Parámetro de penalización por incertidumbre
             iteraciones_consenso: Número de iteraciones de consenso por ronda
+                (con al menos el diámetro del grafo todos los robots acuerdan el ganador)
             sigma_umbral: Umbral de incertidumbre para liberar tareas
         """
         self.entorno = entorno
-        self.epsilon = epsilon
         self.lambda_penalizacion = lambda_penalizacion
         self.iteraciones_consenso = iteraciones_consenso
         self.sigma_umbral = sigma_umbral
         
         # Estado del algoritmo
-        self.estimaciones_tareas: Dict[int, Dict] = {}  # {tarea_id: {robot_id: (pos, sigma, confianza)}}
-        self.asignaciones_probabilisticas: Dict[int, Dict[int, float]] = {}  # {tarea_id: {robot_id: prob}}
+        # Última estimación de cada robot por tarea, como matrices (tareas x robots)
+        self.indice_tareas: Dict[int, int] = {}  # {tarea_id: fila en las matrices de estado}
+        self.pickup_x = np.zeros((0, len(entorno.robots)), dtype=np.int32)
+        self.pickup_y = np.zeros((0, len(entorno.robots)), dtype=np.int32)
+        self.delivery_x = np.zeros((0, len(entorno.robots)), dtype=np.int32)
+        self.delivery_y = np.zeros((0, len(entorno.robots)), dtype=np.int32)
+        self.sigma = np.zeros((0, len(entorno.robots)), dtype=np.float32)
+        self.confianza = np.zeros((0, len(entorno.robots)), dtype=np.float32)
+        self.observado = np.zeros((0, len(entorno.robots)), dtype=bool)  # Entradas con estimación válida
+        self.tareas_modificadas: Set[int] = set()  # Tareas observadas, asignadas o ejecutadas desde el último consenso
+        
+        # Consenso de máximo sobre pujas: claves enteras únicas (-1 = sin puja), (tareas x robots)
+        self.pujas = np.full((0, len(entorno.robots)), -1, dtype=np.int32)  # Puja propia de cada robot
+        self.X = self.pujas.copy()  # Mejor puja conocida por cada robot tras el consenso
+        self._X_buffer = self.X.copy()  # Buffer de escritura de la siguiente iteración
+        self._utilidades = np.zeros((len(entorno.robots), 0))  # Utilidades de la ronda (robots x tareas)
+        # Grafo de consenso en CSR: vecinos más el propio robot, de modo que ninguna fila queda vacía
+        self._indptr_consenso = np.arange(len(entorno.robots) + 1, dtype=np.intp)
+        self._indices_consenso = np.arange(len(entorno.robots), dtype=np.intp)
+        self._version_vecinos = -1  # Versión de la topología usada para construir los grafos CSR
+        # Grafo de comunicación en formato CSR: vecinos de i en indices[indptr[i]:indptr[i + 1]]
+        self._indptr_vecinos = np.zeros(len(entorno.robots) + 1, dtype=np.intp)
+        self._indices_vecinos = np.zeros(0, dtype=np.intp)
     
     def inicializar(self):
         """Inicializa el estado de todos los robots."""
         for robot in self.entorno.robots:
-            robot.tareas_conocidas = set()
-            robot.tareas_asignadas = set()
-            robot.tareas_completadas = set()
+            robot.tareas_conocidas = 0
+            robot.tareas_asignadas = 0
+            robot.tareas_completadas = 0
             robot.carga_actual = 0
             robot.confianza_tareas = {}
             robot.asignaciones_propuestas = {}
         
-        # Inicializar estimaciones
-        self.estimaciones_tareas = {}
-        self.asignaciones_probabilisticas = {}
+        # Inicializar estimaciones: una fila por tarea del entorno y una columna por robot
+        forma = (len(self.entorno.tareas), len(self.entorno.robots))
+        self.indice_tareas = dict(self.entorno.indice_tareas)
+        self.pickup_x = np.zeros(forma, dtype=np.int32)
+        self.pickup_y = np.zeros(forma, dtype=np.int32)
+        self.delivery_x = np.zeros(forma, dtype=np.int32)
+        self.delivery_y = np.zeros(forma, dtype=np.int32)
+        self.sigma = np.zeros(forma, dtype=np.float32)
+        self.confianza = np.zeros(forma, dtype=np.float32)
+        self.observado = np.zeros(forma, dtype=bool)
+        self.tareas_modificadas = set()
+        for tarea in self.entorno.tareas:
+            tarea.reiniciar_fusion()
+        
+        self.pujas = np.full(forma, -1, dtype=np.int32)
+        self.X = self.pujas.copy()
+        self._X_buffer = self.X.copy()
+        self._utilidades = np.zeros((len(self.entorno.robots), len(self.entorno.tareas)))
+        self._version_vecinos = -1  # Los grafos se construyen en la primera ronda, tras la percepción
+    
+    @property
+    def asignaciones_probabilisticas(self) -> Dict[int, Dict[int, float]]:
+        """
+        Asignaciones en forma de diccionario {tarea_id: {robot_id: prob}}.
+        
+        Tras el consenso de máximo la asignación es determinista: 1.0 para el robot
+        cuya puja es la mejor que conoce para la tarea y 0.0 para el resto. El estado
+        interno son las matrices pujas y X; el diccionario solo se construye al pedirlo.
+        """
+        ganadores = ((self.pujas >= 0) & (self.pujas == self.X)).astype(float).tolist()
+        return {
+            tarea_id: dict(enumerate(ganadores[fila]))
+            for tarea_id, fila in self.indice_tareas.items()
+            if self.observado[fila].any()
+        }
     
     def ejecutar_ronda(self) -> bool:
         """
@@ -60,180 +113,249 @@ class AlgoritmoConsensoIncertidumbre:
         Returns:
             True si hay progreso, False si no hay cambios
         """
-        # Paso 1: Percepción y actualización local
+        # Paso 1: Percepción, actualización local y fusión de información
         self._percepcion_local()
         
-        # Paso 2: Comunicación y fusión de información
-        self._fusionar_informacion()
+        # Actualizar la caché de vecinos si la topología ha cambiado; los fallos de comunicación
+        # se generan después de la percepción, como en el paso de consenso
+        topologia_cambiada = self._actualizar_vecinos()
+        
+        # Sin observaciones, asignaciones, movimientos ni cambios de topología desde el último
+        # consenso, el consenso y la selección darían el mismo resultado: solo se ejecuta
+        if not self.tareas_modificadas and not topologia_cambiada:
+            return self._ejecutar_tareas_adaptativo()
         
-        # Paso 3: Consenso sobre asignaciones
+        # Paso 2: Consenso sobre asignaciones
         self._consenso_asignaciones()
+        self.tareas_modificadas.clear()
         
-        # Paso 4: Selección de tareas con incertidumbre
+        # Paso 3: Selección de tareas con incertidumbre
         self._seleccionar_tareas_incertidumbre()
         
-        # Paso 5: Ejecución adaptativa
+        # Paso 4: Ejecución adaptativa
         progreso = self._ejecutar_tareas_adaptativo()
         
         return progreso
     
     def _percepcion_local(self):
-        """Cada robot detecta tareas y actualiza sus estimaciones locales."""
-        for robot in self.entorno.robots:
-            tareas_detectadas = self.entorno.detectar_tareas(robot.id_robot)
-            
-            for tarea_detectada in tareas_detectadas:
-                tarea_id = tarea_detectada.id_tarea
-                robot.tareas_conocidas.add(tarea_id)
-                
-                # Actualizar estimación local usando filtrado bayesiano simple
-                if tarea_id not in self.estimaciones_tareas:
-                    self.estimaciones_tareas[tarea_id] = {}
-                
-                # Calcular sigma basado en el ruido de percepción
-                sigma = self.entorno.ruido_percepcion
-                
-                # Actualizar confianza (aumenta con más observaciones)
-                if tarea_id in robot.confianza_tareas:
-                    robot.confianza_tareas[tarea_id] += 0.1
-                else:
-                    robot.confianza_tareas[tarea_id] = 1.0
-                
-                # Guardar estimación
-                self.estimaciones_tareas[tarea_id][robot.id_robot] = {
-                    'pickup': tarea_detectada.posicion_pickup,
-                    'delivery': tarea_detectada.posicion_delivery,
-                    'sigma': sigma,
-                    'confianza': robot.confianza_tareas[tarea_id]
-                }
+        """
+        Cada robot detecta tareas, actualiza sus estimaciones locales y las fusiona.
+        
+        La fusión (promedio ponderado por confianza) se actualiza de forma incremental en
+        la misma pasada, solo para las tareas observadas en la ronda. Las observaciones de
+        todos los robots se procesan juntas: cada par (tarea, robot) aparece como mucho una
+        vez por ronda, así que las actualizaciones son independientes.
+        """
+        detecciones = self.entorno.detectar_tareas_arrays()
+        if detecciones.tareas.size == 0:
+            return
+        
+        for robot, ids_detectados in zip(self.entorno.robots, detecciones.ids_por_robot(len(self.entorno.robots))):
+            robot.tareas_conocidas |= mascara_de(ids_detectados)
+        
+        ids = detecciones.tareas.tolist()
+        filas = np.array([self.indice_tareas[tarea_id] for tarea_id in ids])
+        cols = detecciones.robots
+        pickup = detecciones.pickup
+        delivery = detecciones.delivery
+        
+        # Calcular sigma basado en el ruido de percepción
+        sigma = self.entorno.ruido_percepcion
+        
+        # Estimación previa de cada robot, que la nueva reemplaza en la fusión
+        observado = self.observado[filas, cols]
+        confianza_anterior = self.confianza[filas, cols].astype(np.float64)
+        anteriores = np.column_stack((self.pickup_x[filas, cols], self.pickup_y[filas, cols],
+                                      self.delivery_x[filas, cols], self.delivery_y[filas, cols],
+                                      self.sigma[filas, cols]))
+        
+        # Actualizar confianza (aumenta con más observaciones)
+        confianza = np.where(observado, confianza_anterior + 0.1, 1.0)
+        for col, tarea_id, valor in zip(cols.tolist(), ids, confianza.tolist()):
+            self.entorno.robots[col].confianza_tareas[tarea_id] = valor
+        
+        # Guardar estimación local usando filtrado bayesiano simple
+        self.pickup_x[filas, cols] = pickup[:, 0]
+        self.pickup_y[filas, cols] = pickup[:, 1]
+        self.delivery_x[filas, cols] = delivery[:, 0]
+        self.delivery_y[filas, cols] = delivery[:, 1]
+        self.sigma[filas, cols] = sigma
+        self.confianza[filas, cols] = confianza
+        self.observado[filas, cols] = True
+        
+        # Variación de la fusión de cada tarea: estimaciones nuevas menos las reemplazadas
+        nuevos = np.column_stack((pickup, delivery, np.full(len(ids), sigma)))
+        peso_anterior = np.where(observado, confianza_anterior, 0.0)
+        delta = nuevos * confianza[:, None] - anteriores * peso_anterior[:, None]
+        suma = np.zeros((len(self.entorno.tareas), 5))
+        peso = np.zeros(len(self.entorno.tareas))
+        np.add.at(suma, filas, delta)
+        np.add.at(peso, filas, confianza - peso_anterior)
+        
+        tareas = list(self.entorno.tareas)
+        for fila in np.unique(filas).tolist():
+            tarea = tareas[fila]
+            tarea.incorporar_suma(suma[fila], peso[fila])
+            tarea.aplicar_fusion()
+            self.tareas_modificadas.add(tarea.id_tarea)
     
-    def _fusionar_informacion(self):
-        """Fusiona estimaciones de múltiples robots usando promedio ponderado por confianza."""
-        for tarea_id, estimaciones_robots in self.estimaciones_tareas.items():
-            if not estimaciones_robots:
-                continue
-            
-            # Calcular posiciones fusionadas usando promedio ponderado
-            confianza_total = sum(est['confianza'] for est in estimaciones_robots.values())
-            
-            if confianza_total == 0:
-                continue
-            
-            # Fusionar pickup
-            pickup_fusionado_x = sum(est['pickup'][0] * est['confianza'] 
-                                     for est in estimaciones_robots.values()) / confianza_total
-            pickup_fusionado_y = sum(est['pickup'][1] * est['confianza'] 
-                                     for est in estimaciones_robots.values()) / confianza_total
-            
-            # Fusionar delivery
-            delivery_fusionado_x = sum(est['delivery'][0] * est['confianza'] 
-                                       for est in estimaciones_robots.values()) / confianza_total
-            delivery_fusionado_y = sum(est['delivery'][1] * est['confianza'] 
-                                        for est in estimaciones_robots.values()) / confianza_total
-            
-            # Actualizar la tarea con las estimaciones fusionadas
-            tarea = self.entorno.tareas.get(tarea_id)
-            if tarea:
-                tarea.posicion_pickup = (int(round(pickup_fusionado_x)), int(round(pickup_fusionado_y)))
-                tarea.posicion_delivery = (int(round(delivery_fusionado_x)), int(round(delivery_fusionado_y)))
-                
-                # Calcular sigma fusionado (promedio ponderado)
-                sigma_fusionado = sum(est['sigma'] * est['confianza'] 
-                                     for est in estimaciones_robots.values()) / confianza_total
-                tarea.sigma_pickup = sigma_fusionado
-                tarea.sigma_delivery = sigma_fusionado
-                tarea.confianza_total = confianza_total
+    def _actualizar_vecinos(self) -> bool:
+        """
+        Recalcula los grafos CSR de vecinos y de consenso solo si la topología ha cambiado.
+        
+        Returns:
+            True si la topología ha cambiado desde la última llamada
+        """
+        if self._version_vecinos == self.entorno.version_topologia:
+            return False
+        
+        # Las filas de la matriz de adyacencia dan directamente los vecinos en formato CSR
+        grafo = self.entorno.grafo_comunicacion()
+        self._indptr_vecinos = np.concatenate(([0], np.cumsum(grafo.sum(axis=1)))).astype(np.intp)
+        self._indices_vecinos = np.nonzero(grafo)[1].astype(np.intp)
+        self._version_vecinos = self.entorno.version_topologia
+        
+        self._indptr_consenso, self._indices_consenso = self._construir_grafo_consenso()
+        return True
+    
+    def _construir_grafo_consenso(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Construye el grafo de comunicación con un lazo en cada robot, en formato CSR.
+        
+        Cada fila empieza por el propio robot seguido de sus vecinos, de modo que ninguna
+        fila queda vacía y el máximo se puede reducir por segmentos.
+        
+        Returns:
+            Tupla (indptr, indices) del grafo (robots x robots)
+        """
+        n = len(self.entorno.robots)
+        indptr = self._indptr_vecinos + np.arange(n + 1)
+        indices = np.insert(self._indices_vecinos, self._indptr_vecinos[:-1], np.arange(n))
+        return indptr, indices
     
     def _consenso_asignaciones(self):
-        """Realiza consenso distribuido sobre las asignaciones propuestas."""
-        # Inicializar asignaciones probabilísticas si no existen
-        for tarea_id in self.estimaciones_tareas.keys():
-            if tarea_id not in self.asignaciones_probabilisticas:
-                self.asignaciones_probabilisticas[tarea_id] = {}
-                for robot in self.entorno.robots:
-                    self.asignaciones_probabilisticas[tarea_id][robot.id_robot] = 0.0
-        
-        # Iteraciones de consenso
+        """
+        Realiza consenso de máximo sobre las pujas de los robots por cada tarea.
+        
+        Cada robot puja por las tareas que podría tomar con su utilidad ajustada, y en cada
+        iteración se queda con la mejor puja entre la suya y las de sus vecinos. Tras tantas
+        iteraciones como el diámetro del grafo, todos los robots conectados conocen el ganador.
+        """
+        tareas = list(self.entorno.tareas)
+        self._utilidades = self._calcular_utilidades(tareas)
+        
+        # Claves enteras únicas: ordenan por utilidad y, a igualdad, gana el robot de menor id
+        n_tareas, n_robots = self.X.shape
+        utilidades = self._utilidades.T
+        ids_robots = np.broadcast_to(np.arange(n_robots), utilidades.shape)
+        orden = np.lexsort((-ids_robots.ravel(), utilidades.ravel()))
+        claves = np.empty(n_tareas * n_robots, dtype=np.int32)
+        claves[orden] = np.arange(n_tareas * n_robots)
+        
+        # Solo pujan los robots con capacidad por las tareas que tienen disponibles
+        disponibles = self._tareas_disponibles(tareas)
+        disponibles[:, [not robot.tiene_capacidad() for robot in self.entorno.robots]] = False
+        np.copyto(self.pujas, np.where(disponibles, claves.reshape(n_tareas, n_robots), -1))
+        
+        # Propagación del máximo por el grafo de comunicación (con lazos)
+        inicios = self._indptr_consenso[:-1]
+        np.copyto(self.X, self.pujas)
         for _ in range(self.iteraciones_consenso):
-            nuevas_asignaciones = {}
+            np.maximum.reduceat(self.X[:, self._indices_consenso], inicios, axis=1, out=self._X_buffer)
             
-            for tarea_id, asignaciones_actuales in self.asignaciones_probabilisticas.items():
-                nuevas_asignaciones[tarea_id] = {}
-                
-                for robot in self.entorno.robots:
-                    robot_id = robot.id_robot
-                    valor_actual = asignaciones_actuales.get(robot_id, 0.0)
-                    
-                    # Obtener valores de vecinos
-                    vecinos = self.entorno.obtener_vecinos_comunicacion(robot_id)
-                    suma_diferencias = 0.0
-                    
-                    for vecino in vecinos:
-                        valor_vecino = asignaciones_actuales.get(vecino.id_robot, 0.0)
-                        suma_diferencias += (valor_vecino - valor_actual)
-                    
-                    # Actualizar usando consenso de promedio
-                    nuevo_valor = valor_actual + self.epsilon * suma_diferencias
-                    nuevas_asignaciones[tarea_id][robot_id] = max(0.0, min(1.0, nuevo_valor))
+            # Punto fijo: si ninguna puja ha cambiado, las siguientes iteraciones tampoco la cambiarían
+            convergido = np.array_equal(self._X_buffer, self.X)
+            self._X_buffer, self.X = self.X, self._X_buffer
+            if convergido:
+                break
+    
+    def _tareas_disponibles(self, tareas: List[Tarea]) -> np.ndarray:
+        """
+        Calcula qué tareas puede tomar cada robot según su conocimiento y el estado actual.
+        
+        Args:
+            tareas: Tareas en el orden de las filas del resultado
+            
+        Returns:
+            Matriz booleana (tareas x robots): conocidas, no completadas y pendientes o asignadas al robot
+        """
+        estados = self.entorno.tarea_estado
+        pendiente = estados == ESTADO_PENDIENTE
+        asignada_a = np.array([tarea.robot_asignado if codigo == ESTADO_ASIGNADA else -1
+                               for tarea, codigo in zip(tareas, estados.tolist())], dtype=np.intp)
+        
+        disponibles = np.zeros((len(tareas), len(self.entorno.robots)), dtype=bool)
+        for robot in self.entorno.robots:
+            col = robot.id_robot
+            pendientes_robot = robot.tareas_conocidas & ~robot.tareas_completadas
+            disponibles[[self.indice_tareas[tid] for tid in iterar_bits(pendientes_robot)], col] = True
+            disponibles[:, col] &= pendiente | (asignada_a == col)
+        return disponibles
+    
+    def _calcular_utilidades(self, tareas: List[Tarea]) -> np.ndarray:
+        """
+        Calcula la utilidad esperada ajustada por incertidumbre de cada par (robot, tarea).
+        
+        Args:
+            tareas: Todas las tareas del entorno, en su orden (el de las columnas del resultado)
             
-            self.asignaciones_probabilisticas = nuevas_asignaciones
+        Returns:
+            Matriz (robots x tareas) con 1/coste - lambda * sigma (inf si el coste es 0)
+        """
+        # Coste esperado (simplificado - usando distancia a estimación)
+        costes = self.entorno.matriz_costes()
+        
+        # Penalización por incertidumbre
+        sigma_total = np.array([(tarea.sigma_pickup + tarea.sigma_delivery) / 2 for tarea in tareas])
+        penalizacion = self.lambda_penalizacion * sigma_total
+        
+        # Utilidad ajustada
+        inversa = np.divide(1.0, costes, out=np.full(costes.shape, np.inf), where=costes > 0)
+        return inversa - penalizacion[None, :]
     
     def _seleccionar_tareas_incertidumbre(self):
         """Selecciona tareas considerando incertidumbre."""
+        tareas = list(self.entorno.tareas)
+        if not tareas:
+            return
+        
+        # Utilidades calculadas en el consenso; cada robot solo puede tomar las tareas que gana
+        utilidades = self._utilidades
+        ganadas = (self.pujas >= 0) & (self.pujas == self.X)
+        
+        # Estado de las tareas, actualizado a medida que los robots se asignan tareas
+        estados = self.entorno.tarea_estado
+        pendiente = estados == ESTADO_PENDIENTE
+        asignada_a = np.array([tarea.robot_asignado if codigo == ESTADO_ASIGNADA else -1
+                               for tarea, codigo in zip(tareas, estados.tolist())])
+        
         for robot in self.entorno.robots:
             if not robot.tiene_capacidad():
                 continue
             
-            # Obtener tareas disponibles
-            tareas_disponibles = []
-            for tarea_id in robot.tareas_conocidas:
-                if tarea_id in robot.tareas_completadas:
-                    continue
-                
-                tarea = self.entorno.tareas.get(tarea_id)
-                if not tarea:
-                    continue
-                
-                if tarea.estado == EstadoTarea.ASIGNADA and tarea.robot_asignado != robot.id_robot:
-                    continue
-                
-                if tarea.estado == EstadoTarea.PENDIENTE or tarea.estado == EstadoTarea.ASIGNADA:
-                    tareas_disponibles.append(tarea)
+            # Tareas ganadas en el consenso que siguen pendientes o ya asignadas a este robot
+            disponibles = ganadas[:, robot.id_robot] & (pendiente | (asignada_a == robot.id_robot))
             
-            if not tareas_disponibles:
+            if not disponibles.any():
                 continue
             
-            # Calcular utilidad esperada ajustada por incertidumbre
-            utilidades = {}
-            for tarea in tareas_disponibles:
-                # Coste esperado (simplificado - usando distancia a estimación)
-                coste_esperado = tarea.coste_total(robot.posicion)
-                
-                # Penalización por incertidumbre
-                sigma_total = (tarea.sigma_pickup + tarea.sigma_delivery) / 2
-                penalizacion = self.lambda_penalizacion * sigma_total
-                
-                # Utilidad ajustada
-                utilidad = (1.0 / coste_esperado if coste_esperado > 0 else float('inf')) - penalizacion
-                utilidades[tarea.id_tarea] = utilidad
-            
             # Seleccionar tarea con mayor utilidad
-            if utilidades:
-                mejor_tarea_id = max(utilidades.keys(), key=lambda tid: utilidades[tid])
-                
-                # Verificar si hay conflicto
-                tarea = self.entorno.tareas[mejor_tarea_id]
-                if tarea.estado == EstadoTarea.PENDIENTE:
-                    # Asignar directamente si no hay conflicto
-                    self._asignar_tarea(robot.id_robot, mejor_tarea_id)
-                elif tarea.estado == EstadoTarea.ASIGNADA and tarea.robot_asignado == robot.id_robot:
-                    # Ya está asignada a este robot
-                    pass
+            mejor = int(np.argmax(np.where(disponibles, utilidades[robot.id_robot], -np.inf)))
+            
+            # Verificar si hay conflicto
+            if pendiente[mejor]:
+                # Asignar directamente si no hay conflicto
+                tarea = tareas[mejor]
+                self._asignar_tarea(robot.id_robot, tarea.id_tarea)
+                if tarea.estado == EstadoTarea.ASIGNADA:
+                    pendiente[mejor] = False
+                    asignada_a[mejor] = robot.id_robot
+            # Si no, ya está asignada a este robot
     
     def _asignar_tarea(self, robot_id: int, tarea_id: int):
         """Asigna una tarea a un robot."""
         robot = self.entorno.robots[robot_id]
-        tarea = self.entorno.tareas[tarea_id]
+        tarea = self.entorno.obtener_tarea(tarea_id)
         
         # Verificar incertidumbre
         sigma_total = (tarea.sigma_pickup + tarea.sigma_delivery) / 2
@@ -244,6 +366,7 @@ class AlgoritmoConsensoIncertidumbre:
         robot.asignar_tarea(tarea_id)
         tarea.estado = EstadoTarea.ASIGNADA
         tarea.robot_asignado = robot_id
+        self.tareas_modificadas.add(tarea_id)
     
     def _ejecutar_tareas_adaptativo(self) -> bool:
         """
@@ -253,28 +376,34 @@ class AlgoritmoConsensoIncertidumbre:
             True si hubo progreso, False en caso contrario
         """
         progreso = False
+        movimientos: List[Tuple[int, Tuple[int, int]]] = []  # (robot_id, destino), se mueven juntos al final
         
         for robot in self.entorno.robots:
             if not robot.tareas_asignadas:
                 continue
             
-            tarea_id = next(iter(robot.tareas_asignadas))
-            tarea = self.entorno.tareas[tarea_id]
+            tarea_id = primer_bit(robot.tareas_asignadas)
+            tarea = self.entorno.obtener_tarea(tarea_id)
             
             # Verificar si la incertidumbre ha crecido demasiado
             sigma_total = (tarea.sigma_pickup + tarea.sigma_delivery) / 2
             if sigma_total > self.sigma_umbral and tarea.estado == EstadoTarea.ASIGNADA:
                 # Liberar tarea
-                robot.tareas_asignadas.discard(tarea_id)
+                robot.tareas_asignadas &= ~(1 << tarea_id)
                 tarea.estado = EstadoTarea.PENDIENTE
                 tarea.robot_asignado = None
+                self.tareas_modificadas.add(tarea_id)
                 progreso = True
                 continue
             
+            # Ejecutar una tarea siempre mueve al robot o cambia la tarea
+            if tarea.estado in (EstadoTarea.ASIGNADA, EstadoTarea.EN_PROGRESO):
+                self.tareas_modificadas.add(tarea_id)
+            
             if tarea.estado == EstadoTarea.ASIGNADA:
                 # Mover hacia el punto de recogida (usando estimación)
                 if robot.posicion != tarea.posicion_pickup:
-                    robot.mover_hacia(tarea.posicion_pickup)
+                    movimientos.append((robot.id_robot, tarea.posicion_pickup))
                     progreso = True
                 else:
                     # Verificar si realmente llegó (comparar con posición real)
@@ -290,7 +419,7 @@ class AlgoritmoConsensoIncertidumbre:
             elif tarea.estado == EstadoTarea.EN_PROGRESO:
                 # Mover hacia el punto de entrega
                 if robot.posicion != tarea.posicion_delivery:
-                    robot.mover_hacia(tarea.posicion_delivery)
+                    movimientos.append((robot.id_robot, tarea.posicion_delivery))
                     progreso = True
                 else:
                     # Verificar si realmente llegó
@@ -304,6 +433,11 @@ class AlgoritmoConsensoIncertidumbre:
                         tarea.posicion_delivery = tarea.posicion_real_delivery
                         progreso = True
         
+        # Cada robot solo cambia su propia posición, así que los pasos se aplican de una vez
+        if movimientos:
+            robot_ids, destinos = zip(*movimientos)
+            self.entorno.mover_robots(list(robot_ids), list(destinos))
+        
         return progreso
     
     def ejecutar(self, max_rondas: int = 1000) -> int:
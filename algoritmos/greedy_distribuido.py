@@ -2,9 +2,54 @@
 Algoritmo 1: Asignación Greedy Distribuida
 Algoritmo distribuido para asignación de tareas en entornos deterministas.
 """
-from typing import List, Dict, Set
-from utils.tarea import EstadoTarea
+from typing import List, Dict, Set, Tuple
+import numpy as np
+from utils.tarea import EstadoTarea, ESTADO_PENDIENTE, ESTADO_ASIGNADA
 from utils.entorno import Entorno
+from utils.mascaras import mascara_de, primer_bit, iterar_bits, mascara_a_array
+
+
+def elegir_tareas(costes: np.ndarray, disponibles: np.ndarray) -> np.ndarray:
+    """
+    Elige para cada robot la tarea disponible de menor coste.
+    
+    Args:
+        costes: Matriz (robots x tareas) de costes
+        disponibles: Matriz booleana (robots x tareas) de tareas que cada robot puede tomar
+        
+    Returns:
+        Columna elegida por cada robot, o -1 si no tiene ninguna disponible
+    """
+    elecciones = np.argmin(np.where(disponibles, costes, np.inf), axis=1)
+    return np.where(disponibles.any(axis=1), elecciones, -1)
+
+
+def resolver_conflictos(costes: np.ndarray, elecciones: np.ndarray) -> np.ndarray:
+    """
+    Asigna cada tarea elegida al solicitante de mayor utilidad (1 / coste).
+    
+    A igualdad de utilidad gana el robot de menor índice.
+    
+    Args:
+        costes: Matriz (robots x tareas) de costes
+        elecciones: Columna elegida por cada robot, o -1 (ver elegir_tareas)
+        
+    Returns:
+        Robot ganador de cada tarea (columna), o -1 si nadie la ha elegido
+    """
+    ganadores = np.full(costes.shape[1], -1, dtype=np.intp)
+    solicitantes = np.flatnonzero(elecciones >= 0)
+    if solicitantes.size == 0:
+        return ganadores
+    
+    tareas = elecciones[solicitantes]
+    
+    # Mayor utilidad = menor coste: ordenar por tarea, coste y robot y quedarse con el primero de cada tarea
+    orden = np.lexsort((solicitantes, costes[solicitantes, tareas], tareas))
+    tareas_ordenadas = tareas[orden]
+    primeros = np.r_[True, tareas_ordenadas[1:] != tareas_ordenadas[:-1]]
+    ganadores[tareas_ordenadas[primeros]] = solicitantes[orden][primeros]
+    return ganadores
 
 
 class AlgoritmoGreedyDistribuido:
@@ -23,17 +68,27 @@ class AlgoritmoGreedyDistribuido:
         self.entorno = entorno
         self.intenciones: Dict[int, Set[int]] = {}  # {robot_id: {tarea_ids}}
         self.asignaciones_confirmadas: Dict[int, int] = {}  # {tarea_id: robot_id}
+        self._mascara_global = 0  # Unión de las tareas conocidas por todos los robots
+        
+        # Costes de la ronda actual: costes[robot_id, columna] para las tareas conocidas por algún robot
+        self.ids_conocidos: List[int] = []
+        self.columnas: Dict[int, int] = {}  # {tarea_id: columna en costes}
+        self.costes = np.zeros((len(entorno.robots), 0))
+        self.elecciones = np.full(len(entorno.robots), -1, dtype=np.intp)  # Columna elegida por cada robot
     
     def inicializar(self):
         """Inicializa el estado de todos los robots."""
+        self._mascara_global = 0
+        detecciones = self.entorno.detectar_tareas_arrays().ids_por_robot(len(self.entorno.robots))
         for robot in self.entorno.robots:
             # Detectar tareas iniciales
-            tareas_detectadas = self.entorno.detectar_tareas(robot.id_robot)
-            robot.tareas_conocidas = {t.id_tarea for t in tareas_detectadas}
-            robot.tareas_asignadas = set()
-            robot.tareas_completadas = set()
+            robot.tareas_conocidas = mascara_de(detecciones[robot.id_robot])
+            robot.tareas_asignadas = 0
+            robot.tareas_completadas = 0
             robot.carga_actual = 0
             self.intenciones[robot.id_robot] = set()
+            self._mascara_global |= robot.tareas_conocidas
+        self._compartir_mascara_global()
     
     def ejecutar_ronda(self) -> bool:
         """
@@ -47,6 +102,7 @@ class AlgoritmoGreedyDistribuido:
         
         # Paso 2: Actualizar conocimiento local
         self._actualizar_conocimiento()
+        self._calcular_costes()
         
         # Paso 3: Selección de tareas
         self._seleccionar_tareas()
@@ -68,99 +124,99 @@ class AlgoritmoGreedyDistribuido:
     
     def _actualizar_conocimiento(self):
         """Cada robot actualiza su conocimiento basándose en la información de vecinos."""
+        # Los fallos de comunicación de la ronda se generan siempre, antes de la percepción, aunque
+        # ningún robot llegue a consultar a sus vecinos: así la secuencia aleatoria no depende de
+        # qué robots conocen ya todas las tareas
+        self.entorno.grafo_comunicacion()
+        
+        # La detección no depende del conocimiento: se calcula para todos los robots a la vez
+        detecciones = self.entorno.detectar_tareas_arrays().ids_por_robot(len(self.entorno.robots))
+        
         for robot in self.entorno.robots:
-            vecinos = self.entorno.obtener_vecinos_comunicacion(robot.id_robot)
-            
-            # Actualizar tareas conocidas
-            for vecino in vecinos:
-                robot.tareas_conocidas.update(vecino.tareas_conocidas)
-                robot.tareas_conocidas.update(vecino.tareas_asignadas)
+            # Un robot que ya conoce todas las tareas conocidas no puede aprender nada de sus vecinos
+            if robot.tareas_conocidas != self._mascara_global:
+                vecinos = self.entorno.obtener_vecinos_comunicacion(robot.id_robot)
+                
+                # Actualizar tareas conocidas (unión de máscaras de bits)
+                for vecino in vecinos:
+                    robot.tareas_conocidas |= vecino.tareas_conocidas | vecino.tareas_asignadas
             
             # Detectar nuevas tareas en rango
-            tareas_detectadas = self.entorno.detectar_tareas(robot.id_robot)
-            robot.tareas_conocidas.update({t.id_tarea for t in tareas_detectadas})
+            robot.tareas_conocidas |= mascara_de(detecciones[robot.id_robot])
+            self._mascara_global |= robot.tareas_conocidas
+        
+        self._compartir_mascara_global()
+    
+    def _compartir_mascara_global(self):
+        """
+        Hace que los robots que conocen todas las tareas conocidas compartan el mismo objeto máscara.
+        
+        Las máscaras son enteros inmutables, así que compartirlas es seguro: cualquier
+        actualización posterior crea un entero nuevo solo para el robot que la hace.
+        """
+        for robot in self.entorno.robots:
+            if robot.tareas_conocidas == self._mascara_global:
+                robot.tareas_conocidas = self._mascara_global
+    
+    def _calcular_costes(self):
+        """Calcula una vez por ronda la matriz de costes (robots x tareas conocidas por algún robot)."""
+        self.ids_conocidos = [tid for tid in iterar_bits(self._mascara_global) if tid in self.entorno.indice_tareas]
+        self.columnas = {tarea_id: col for col, tarea_id in enumerate(self.ids_conocidos)}
+        
+        # Misma distancia que Tarea.coste_total (robot -> pickup -> delivery), columnas de las tareas conocidas
+        filas = [self.entorno.indice_tareas[tid] for tid in self.ids_conocidos]
+        self.costes = self.entorno.matriz_costes()[:, filas]
     
     def _seleccionar_tareas(self):
         """Cada robot selecciona la mejor tarea disponible."""
-        self.intenciones = {}
+        self.intenciones = {robot.id_robot: set() for robot in self.entorno.robots}
+        self.elecciones = np.full(len(self.entorno.robots), -1, dtype=np.intp)
+        
+        if not self.ids_conocidos:
+            return
+        
+        # Estado de las tareas conocidas
+        ids = np.array(self.ids_conocidos)
+        tareas = [self.entorno.obtener_tarea(tid) for tid in self.ids_conocidos]
+        estados = self.entorno.tarea_estado[[self.entorno.indice_tareas[tid] for tid in self.ids_conocidos]]
+        pendiente = estados == ESTADO_PENDIENTE
+        asignada_a = np.array([tarea.robot_asignado if codigo == ESTADO_ASIGNADA else -1
+                               for tarea, codigo in zip(tareas, estados.tolist())])
         
+        # Tareas disponibles: conocidas, no completadas y no asignadas a otro robot
+        disponibles = np.zeros(self.costes.shape, dtype=bool)
         for robot in self.entorno.robots:
-            self.intenciones[robot.id_robot] = set()
-            
             if not robot.tiene_capacidad():
                 continue
             
-            # Obtener tareas disponibles (no asignadas, no completadas)
-            tareas_disponibles = []
-            for tarea_id in robot.tareas_conocidas:
-                if tarea_id in robot.tareas_completadas:
-                    continue
-                
-                tarea = self.entorno.tareas.get(tarea_id)
-                if not tarea:
-                    continue
-                
-                # Verificar si la tarea está asignada a otro robot
-                if tarea.estado == EstadoTarea.ASIGNADA and tarea.robot_asignado != robot.id_robot:
-                    continue
-                
-                if tarea.estado == EstadoTarea.PENDIENTE or tarea.estado == EstadoTarea.ASIGNADA:
-                    tareas_disponibles.append(tarea)
-            
-            if not tareas_disponibles:
-                continue
-            
-            # Calcular coste para cada tarea disponible
-            costes = {}
-            for tarea in tareas_disponibles:
-                coste = tarea.coste_total(robot.posicion)
-                costes[tarea.id_tarea] = coste
-            
-            # Seleccionar la tarea con menor coste
-            if costes:
-                mejor_tarea_id = min(costes.keys(), key=lambda tid: costes[tid])
-                self.intenciones[robot.id_robot].add(mejor_tarea_id)
+            fila = disponibles[robot.id_robot]
+            fila[:] = mascara_a_array(robot.tareas_conocidas & ~robot.tareas_completadas, int(ids[-1]) + 1)[ids]
+            fila &= pendiente | (asignada_a == robot.id_robot)
+        
+        # Seleccionar la tarea con menor coste
+        self.elecciones = elegir_tareas(self.costes, disponibles)
+        for robot_id in np.flatnonzero(self.elecciones >= 0).tolist():
+            self.intenciones[robot_id].add(self.ids_conocidos[self.elecciones[robot_id]])
     
     def _resolver_conflictos(self):
         """Resuelve conflictos cuando múltiples robots quieren la misma tarea."""
-        # Agrupar intenciones por tarea
-        tareas_solicitadas: Dict[int, List[int]] = {}
-        for robot_id, tareas in self.intenciones.items():
-            for tarea_id in tareas:
-                if tarea_id not in tareas_solicitadas:
-                    tareas_solicitadas[tarea_id] = []
-                tareas_solicitadas[tarea_id].append(robot_id)
-        
-        # Para cada tarea con múltiples solicitantes, asignar al robot con mayor utilidad
-        for tarea_id, robots_solicitantes in tareas_solicitadas.items():
-            if len(robots_solicitantes) == 1:
-                # Sin conflicto
-                robot_id = robots_solicitantes[0]
-                self._asignar_tarea(robot_id, tarea_id)
-            else:
-                # Hay conflicto - calcular utilidad para cada robot
-                utilidades = {}
-                tarea = self.entorno.tareas[tarea_id]
-                
-                for robot_id in robots_solicitantes:
-                    robot = self.entorno.robots[robot_id]
-                    coste = tarea.coste_total(robot.posicion)
-                    utilidad = 1.0 / coste if coste > 0 else float('inf')
-                    utilidades[robot_id] = utilidad
-                
-                # Asignar al robot con mayor utilidad
-                robot_ganador = max(utilidades.keys(), key=lambda rid: utilidades[rid])
-                self._asignar_tarea(robot_ganador, tarea_id)
-                
-                # Los demás robots eliminan esta tarea de sus candidatos
-                for robot_id in robots_solicitantes:
-                    if robot_id != robot_ganador:
-                        self.intenciones[robot_id].discard(tarea_id)
+        # Para cada tarea solicitada, asignar al robot con mayor utilidad
+        ganadores = resolver_conflictos(self.costes, self.elecciones)
+        
+        for col in np.flatnonzero(ganadores >= 0).tolist():
+            tarea_id = self.ids_conocidos[col]
+            robot_ganador = int(ganadores[col])
+            self._asignar_tarea(robot_ganador, tarea_id)
+        
+        # Los demás robots eliminan esta tarea de sus candidatos
+        for robot_id in np.flatnonzero(self.elecciones >= 0).tolist():
+            if ganadores[self.elecciones[robot_id]] != robot_id:
+                self.intenciones[robot_id].clear()
     
     def _asignar_tarea(self, robot_id: int, tarea_id: int):
         """Asigna una tarea a un robot."""
         robot = self.entorno.robots[robot_id]
-        tarea = self.entorno.tareas[tarea_id]
+        tarea = self.entorno.obtener_tarea(tarea_id)
         
         robot.asignar_tarea(tarea_id)
         tarea.estado = EstadoTarea.ASIGNADA
@@ -175,19 +231,20 @@ class AlgoritmoGreedyDistribuido:
             True si hubo progreso, False en caso contrario
         """
         progreso = False
+        movimientos: List[Tuple[int, Tuple[int, int]]] = []  # (robot_id, destino), se mueven juntos al final
         
         for robot in self.entorno.robots:
             if not robot.tareas_asignadas:
                 continue
             
             # Obtener la tarea asignada más prioritaria (la primera en la lista)
-            tarea_id = next(iter(robot.tareas_asignadas))
-            tarea = self.entorno.tareas[tarea_id]
+            tarea_id = primer_bit(robot.tareas_asignadas)
+            tarea = self.entorno.obtener_tarea(tarea_id)
             
             if tarea.estado == EstadoTarea.ASIGNADA:
                 # Mover hacia el punto de recogida
                 if robot.posicion != tarea.posicion_pickup:
-                    robot.mover_hacia(tarea.posicion_pickup)
+                    movimientos.append((robot.id_robot, tarea.posicion_pickup))
                     progreso = True
                 else:
                     # Llegó al punto de recogida
@@ -198,7 +255,7 @@ class AlgoritmoGreedyDistribuido:
             elif tarea.estado == EstadoTarea.EN_PROGRESO:
                 # Mover hacia el punto de entrega
                 if robot.posicion != tarea.posicion_delivery:
-                    robot.mover_hacia(tarea.posicion_delivery)
+                    movimientos.append((robot.id_robot, tarea.posicion_delivery))
                     progreso = True
                 else:
                     # Llegó al punto de entrega - completar tarea
@@ -207,6 +264,11 @@ class AlgoritmoGreedyDistribuido:
                     tarea.robot_asignado = None
                     progreso = True
         
+        # Cada robot solo cambia su propia posición, así que los pasos se aplican de una vez
+        if movimientos:
+            robot_ids, destinos = zip(*movimientos)
+            self.entorno.mover_robots(list(robot_ids), list(destinos))
+        
         return progreso
     
     def ejecutar(self, max_rondas: int = 1000) -> int:
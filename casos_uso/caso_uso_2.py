@@ -2,26 +2,50 @@
 Caso de uso 2: Algoritmo de Consenso con Incertidumbre
 Evalúa el Algoritmo 2 en un entorno con incertidumbre.
 """
-import sys
-import os
-# Añadir el directorio raíz al path de Python
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
 import numpy as np
-import random
+import hashlib
+import json
 import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from typing import Dict
+from typing import Dict, List, Optional
 from utils.robot import Robot
 from utils.tarea import Tarea
 from utils.entorno import Entorno
-from utils.metricas import calcular_metricas, imprimir_metricas
+from utils.metricas import calcular_metricas, calcular_estadisticas, imprimir_metricas, imprimir_estado_final
 from algoritmos.consenso_incertidumbre import AlgoritmoConsensoIncertidumbre
 
+# Caché en disco de las métricas por (parámetros, semilla). Incrementar VERSION_CACHE
+# al cambiar los algoritmos o la generación de escenarios para invalidar los resultados guardados
+VERSION_CACHE = 3
+DIRECTORIO_CACHE = os.path.join("resultados", ".cache")
 
-def generar_posicion_aleatoria(dimensiones: tuple) -> tuple:
-    """Genera una posición aleatoria dentro de las dimensiones."""
-    return (random.randint(0, dimensiones[0] - 1), random.randint(0, dimensiones[1] - 1))
+
+def generar_posiciones_aleatorias(dimensiones: tuple, n: int, rng: np.random.Generator) -> np.ndarray:
+    """Genera n posiciones aleatorias (matriz n x 2) dentro de las dimensiones con una sola llamada a NumPy."""
+    return rng.integers(0, dimensiones, size=(n, 2))
+
+
+def generar_entregas(dimensiones: tuple, pickups: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """
+    Genera una posición de entrega aleatoria distinta de cada posición de recogida, sin reintentos.
+    
+    Se numeran las celdas de 0 a ancho * alto - 1 y la entrega se obtiene desplazando la
+    recogida un número aleatorio de celdas entre 1 y ancho * alto - 1 (módulo el total).
+    
+    Args:
+        dimensiones: Dimensiones del espacio
+        pickups: Posiciones de recogida (matriz n x 2)
+        rng: Generador aleatorio
+        
+    Returns:
+        Posiciones de entrega (matriz n x 2)
+    """
+    ancho, alto = dimensiones
+    celdas = ancho * alto
+    desplazamientos = rng.integers(1, celdas, size=len(pickups))
+    indices = (pickups[:, 0] * alto + pickups[:, 1] + desplazamientos) % celdas
+    return np.column_stack((indices // alto, indices % alto))
 
 
 def crear_entorno_experimento(num_robots: int = 5,
@@ -47,49 +71,26 @@ def crear_entorno_experimento(num_robots: int = 5,
         probabilidad_fallo_comunicacion: Probabilidad de fallo de comunicación
         semilla: Semilla aleatoria para reproducibilidad
     """
-    if semilla is not None:
-        np.random.seed(semilla)
-        random.seed(semilla)
-    
-    # Crear robots
-    robots = []
-    for i in range(num_robots):
-        posicion_inicial = generar_posicion_aleatoria(dimensiones)
-        robot = Robot(
-            id_robot=i,
-            posicion_inicial=posicion_inicial,
-            capacidad=capacidad,
-            rango_percepcion=rango_percepcion,
-            rango_comunicacion=rango_comunicacion
-        )
-        robots.append(robot)
-    
-    # Crear tareas
-    tareas = []
-    for j in range(num_tareas):
-        posicion_pickup = generar_posicion_aleatoria(dimensiones)
-        posicion_delivery = generar_posicion_aleatoria(dimensiones)
-        
-        # Asegurar que pickup y delivery sean diferentes
-        while posicion_delivery == posicion_pickup:
-            posicion_delivery = generar_posicion_aleatoria(dimensiones)
-        
-        tarea = Tarea(
-            id_tarea=j,
-            posicion_pickup=posicion_pickup,  # Inicialmente igual a la real
-            posicion_delivery=posicion_delivery,
-            posicion_real_pickup=posicion_pickup,  # Guardar posición real
-            posicion_real_delivery=posicion_delivery
-        )
-        tareas.append(tarea)
+    # Generador propio del experimento: no depende ni modifica el estado global de np.random
+    rng = np.random.default_rng(semilla)
+    
+    # Muestrear de una vez las posiciones de robots y recogidas, y las entregas de todas las tareas
+    muestras = generar_posiciones_aleatorias(dimensiones, num_robots + num_tareas, rng)
+    pickups = muestras[num_robots:]
+    entregas = generar_entregas(dimensiones, pickups, rng)  # Distintas de su recogida
     
     # Crear entorno con incertidumbre
-    entorno = Entorno(
+    entorno = Entorno.desde_arrays(
+        robot_pos=muestras[:num_robots],
+        tarea_pickup=pickups,
+        tarea_delivery=entregas,
         dimensiones=dimensiones,
-        robots=robots,
-        tareas=tareas,
         ruido_percepcion=ruido_percepcion,
-        probabilidad_fallo_comunicacion=probabilidad_fallo_comunicacion
+        probabilidad_fallo_comunicacion=probabilidad_fallo_comunicacion,
+        rng=rng,
+        capacidad=capacidad,
+        rango_percepcion=rango_percepcion,
+        rango_comunicacion=rango_comunicacion
     )
     
     return entorno
@@ -135,9 +136,8 @@ def ejecutar_experimento(num_robots: int = 5,
     # Crear y ejecutar algoritmo
     algoritmo = AlgoritmoConsensoIncertidumbre(
         entorno,
-        epsilon=0.2,
         lambda_penalizacion=0.3,
-        iteraciones_consenso=5,
+        iteraciones_consenso=3,
         sigma_umbral=2.0
     )
     rondas = algoritmo.ejecutar(max_rondas=1000)
@@ -148,126 +148,171 @@ def ejecutar_experimento(num_robots: int = 5,
     
     if verbose:
         imprimir_metricas(metricas)
-        print(f"Tareas completadas por robot:")
-        for robot in entorno.robots:
-            print(f"  Robot {robot.id_robot}: {robot.tareas_completadas_count} tareas")
+        imprimir_estado_final(entorno)
     
     return metricas
 
 
-def guardar_resultados(resultados: Dict, nombre_archivo: str):
+def _inicializar_proceso():
+    """
+    Prepara un proceso trabajador ejecutando el algoritmo sobre un entorno mínimo.
+    
+    Así el coste de la primera llamada (importaciones diferidas de NumPy, cachés de
+    funciones) se paga al arrancar el proceso y no dentro de la primera ejecución.
+    """
+    entorno = Entorno(
+        robots=[Robot(id_robot=0, posicion_inicial=(0, 0))],
+        tareas=[Tarea(id_tarea=0, posicion_pickup=(1, 0), posicion_delivery=(1, 1))]
+    )
+    AlgoritmoConsensoIncertidumbre(entorno).ejecutar(max_rondas=10)
+
+
+def ejecutar_experimento_cacheado(**parametros) -> Dict:
+    """
+    Ejecuta un experimento reutilizando sus métricas guardadas en disco si ya se ejecutó.
+    
+    Con semilla fija cada experimento es determinista, así que el resultado se guarda en
+    DIRECTORIO_CACHE como JSON, con la versión de la caché y los parámetros como clave.
+    
+    Args:
+        **parametros: Parámetros de ejecutar_experimento (sin verbose)
+        
+    Returns:
+        Diccionario con métricas del experimento
+    """
+    if parametros.get('semilla') is None:
+        return ejecutar_experimento(verbose=False, **parametros)
+    
+    clave = ('caso_uso_2', VERSION_CACHE, tuple(sorted(parametros.items())))
+    ruta = os.path.join(DIRECTORIO_CACHE, hashlib.sha1(repr(clave).encode()).hexdigest() + '.json')
+    if os.path.exists(ruta):
+        with open(ruta, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    metricas = ejecutar_experimento(verbose=False, **parametros)
+    
+    # Escritura atómica: un archivo a medio escribir nunca se lee como resultado válido
+    os.makedirs(DIRECTORIO_CACHE, exist_ok=True)
+    ruta_temporal = f"{ruta}.{os.getpid()}.tmp"
+    with open(ruta_temporal, 'w', encoding='utf-8') as f:
+        json.dump(metricas, f, default=float)
+    os.replace(ruta_temporal, ruta)
+    return metricas
+
+
+def ejecutar_barrido(experimentos: Dict[str, Dict], num_semillas: int = 10) -> Dict[str, List[Dict]]:
+    """
+    Ejecuta varios experimentos con las semillas 0..num_semillas-1 en un único pool de procesos.
+    
+    Todas las ejecuciones (experimentos x semillas) se envían juntas, de modo que los procesos
+    no quedan ociosos entre un experimento y el siguiente. Cada ejecución es independiente
+    (entorno propio, semilla propia), por lo que los resultados son los mismos que en una
+    ejecución secuencial. Las semillas ya ejecutadas se leen de la caché en disco.
+    
+    Args:
+        experimentos: Diccionario {nombre: parámetros de ejecutar_experimento}
+        num_semillas: Número de ejecuciones (semillas) por experimento
+        
+    Returns:
+        Diccionario {nombre: lista con las métricas de cada ejecución, ordenada por semilla}
+    """
+    with ProcessPoolExecutor(max_workers=os.cpu_count(), initializer=_inicializar_proceso) as ejecutor:
+        futuros = {
+            nombre: [ejecutor.submit(ejecutar_experimento_cacheado, semilla=semilla, **parametros)
+                     for semilla in range(num_semillas)]
+            for nombre, parametros in experimentos.items()
+        }
+        return {nombre: [futuro.result() for futuro in lista] for nombre, lista in futuros.items()}
+
+
+def guardar_resultados(resultados: Dict, nombre_archivo: str, fecha: Optional[datetime] = None):
     """
     Guarda los resultados en un archivo de texto.
     
     Args:
         resultados: Diccionario con los resultados de los experimentos
         nombre_archivo: Nombre del archivo donde guardar
+        fecha: Fecha de ejecución para la cabecera (si es None, la actual)
     """
+    if fecha is None:
+        fecha = datetime.now()
+    
     # Crear directorio de resultados si no existe
     directorio_resultados = "resultados"
-    if not os.path.exists(directorio_resultados):
-        os.makedirs(directorio_resultados)
+    os.makedirs(directorio_resultados, exist_ok=True)
     
     ruta_archivo = os.path.join(directorio_resultados, nombre_archivo)
     
-    with open(ruta_archivo, 'w', encoding='utf-8') as f:
-        f.write("="*80 + "\n")
-        f.write("CASO DE USO 2: Algoritmo de Consenso con Incertidumbre\n")
-        f.write("="*80 + "\n")
-        f.write(f"Fecha de ejecución: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        f.write("="*80 + "\n\n")
+    # El reporte se compone en memoria y se escribe con una sola llamada
+    partes = []
+    partes.append("="*80 + "\n")
+    partes.append("CASO DE USO 2: Algoritmo de Consenso con Incertidumbre\n")
+    partes.append("="*80 + "\n")
+    partes.append(f"Fecha de ejecución: {fecha.strftime('%Y-%m-%d %H:%M:%S')}\n")
+    partes.append("="*80 + "\n\n")
+    
+    for exp_nombre, exp_resultados in resultados.items():
+        partes.append("\n" + "="*80 + "\n")
+        partes.append(f"{exp_nombre.upper().replace('_', ' ')}\n")
+        partes.append("="*80 + "\n\n")
         
-        for exp_nombre, exp_resultados in resultados.items():
-            f.write("\n" + "="*80 + "\n")
-            f.write(f"{exp_nombre.upper().replace('_', ' ')}\n")
-            f.write("="*80 + "\n\n")
+        # Calcular estadísticas
+        if exp_resultados:
+            promedios, desviaciones = calcular_estadisticas(exp_resultados)
             
-            # Calcular estadísticas
-            if exp_resultados:
-                promedios = {}
-                desviaciones = {}
-                
-                for key in exp_resultados[0].keys():
-                    valores = [r[key] for r in exp_resultados]
-                    promedios[key] = np.mean(valores)
-                    desviaciones[key] = np.std(valores)
-                
-                f.write("Resultados promedio (10 ejecuciones):\n")
-                f.write("-"*80 + "\n")
-                for key in sorted(promedios.keys()):
-                    f.write(f"  {key:30s}: {promedios[key]:10.2f} ± {desviaciones[key]:.2f}\n")
-                
-                f.write("\nResultados individuales:\n")
-                f.write("-"*80 + "\n")
-                for i, resultado in enumerate(exp_resultados):
-                    f.write(f"\nEjecución {i+1}:\n")
-                    for key in sorted(resultado.keys()):
-                        f.write(f"  {key:30s}: {resultado[key]:10.2f}\n")
-        
-        f.write("\n" + "="*80 + "\n")
-        f.write("FIN DEL REPORTE\n")
-        f.write("="*80 + "\n")
+            # Todas las ejecuciones tienen las mismas métricas: ordenarlas una sola vez
+            claves = sorted(promedios.keys())
+            formato_linea = "  {:30s}: {:10.2f}\n"
+            
+            partes.append("Resultados promedio (10 ejecuciones):\n")
+            partes.append("-"*80 + "\n")
+            for key in claves:
+                partes.append(f"  {key:30s}: {promedios[key]:10.2f} ± {desviaciones[key]:.2f}\n")
+            
+            partes.append("\nResultados individuales:\n")
+            partes.append("-"*80 + "\n")
+            for i, resultado in enumerate(exp_resultados):
+                partes.append(f"\nEjecución {i+1}:\n"
+                              + "".join(formato_linea.format(key, resultado[key]) for key in claves))
+    
+    partes.append("\n" + "="*80 + "\n")
+    partes.append("FIN DEL REPORTE\n")
+    partes.append("="*80 + "\n")
+    
+    with open(ruta_archivo, 'w', encoding='utf-8') as f:
+        f.write(''.join(partes))
     
     print(f"\n✓ Resultados guardados en: {ruta_archivo}")
 
 
 def ejecutar_caso_uso_2():
     """Ejecuta todos los experimentos del Caso de uso 2."""
-    resultados = {}
-    
-    # Experimento 2.1: Incertidumbre baja (σ = 0.3)
-    print("\n" + "="*60)
-    print("EXPERIMENTO 2.1: Incertidumbre baja (σ = 0.3)")
-    print("="*60)
-    resultados_exp_2_1 = []
-    for semilla in range(10):
-        metricas = ejecutar_experimento(
-            num_robots=5,
-            num_tareas=10,
-            ruido_percepcion=0.3,
-            semilla=semilla,
-            verbose=False
-        )
-        resultados_exp_2_1.append(metricas)
-    
-    resultados['experimento_2_1'] = resultados_exp_2_1
-    
-    # Calcular promedios
-    print("\nResultados promedio (10 ejecuciones):")
-    promedios = {}
-    for key in resultados_exp_2_1[0].keys():
-        valores = [r[key] for r in resultados_exp_2_1]
-        promedios[key] = np.mean(valores)
-        print(f"  {key}: {promedios[key]:.2f}")
-    
-    # Experimento 2.2: Incertidumbre alta (σ = 1.0)
-    print("\n" + "="*60)
-    print("EXPERIMENTO 2.2: Incertidumbre alta (σ = 1.0)")
-    print("="*60)
-    resultados_exp_2_2 = []
-    for semilla in range(10):
-        metricas = ejecutar_experimento(
-            num_robots=5,
-            num_tareas=10,
-            ruido_percepcion=1.0,
-            semilla=semilla,
-            verbose=False
-        )
-        resultados_exp_2_2.append(metricas)
-    
-    resultados['experimento_2_2'] = resultados_exp_2_2
-    
-    # Calcular promedios
-    print("\nResultados promedio (10 ejecuciones):")
-    promedios = {}
-    for key in resultados_exp_2_2[0].keys():
-        valores = [r[key] for r in resultados_exp_2_2]
-        promedios[key] = np.mean(valores)
-        print(f"  {key}: {promedios[key]:.2f}")
+    # Experimentos: {nombre: (título, parámetros)}
+    experimentos = {
+        'experimento_2_1': ("EXPERIMENTO 2.1: Incertidumbre baja (σ = 0.3)",
+                            {'num_robots': 5, 'num_tareas': 10, 'ruido_percepcion': 0.3}),
+        'experimento_2_2': ("EXPERIMENTO 2.2: Incertidumbre alta (σ = 1.0)",
+                            {'num_robots': 5, 'num_tareas': 10, 'ruido_percepcion': 1.0}),
+    }
+    
+    # Las 20 ejecuciones (2 experimentos x 10 semillas) se reparten en un único pool
+    resultados = ejecutar_barrido({nombre: parametros for nombre, (_, parametros) in experimentos.items()})
+    
+    for nombre, (titulo, _) in experimentos.items():
+        print("\n" + "="*60)
+        print(titulo)
+        print("="*60)
+        
+        # Calcular promedios
+        print("\nResultados promedio (10 ejecuciones):")
+        promedios, _ = calcular_estadisticas(resultados[nombre])
+        for key, promedio in promedios.items():
+            print(f"  {key}: {promedio:.2f}")
     
     # Guardar resultados
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    guardar_resultados(resultados, f"caso_uso_2_{timestamp}.txt")
+    # Una sola fecha para el nombre del archivo y la cabecera del reporte
+    fecha = datetime.now()
+    guardar_resultados(resultados, f"caso_uso_2_{fecha.strftime('%Y%m%d_%H%M%S')}.txt", fecha)
     
     return resultados
 
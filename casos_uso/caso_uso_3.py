@@ -2,20 +2,16 @@
 Caso de uso 3: Comparación directa entre ambos algoritmos
 Compara el Algoritmo 1 y el Algoritmo 2 en las mismas condiciones.
 """
-import sys
-import os
-# Añadir el directorio raíz al path de Python
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
 import numpy as np
 import random
 import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from typing import Dict, Tuple
+from typing import Dict, List, Optional, Tuple
 from utils.robot import Robot
 from utils.tarea import Tarea
 from utils.entorno import Entorno
-from utils.metricas import calcular_metricas
+from utils.metricas import calcular_metricas, calcular_estadisticas, imprimir_estado_final
 from algoritmos.greedy_distribuido import AlgoritmoGreedyDistribuido
 from algoritmos.consenso_incertidumbre import AlgoritmoConsensoIncertidumbre
 
@@ -41,36 +37,24 @@ def crear_entorno_comun(num_robots: int = 5,
         Tupla (entorno_greedy, entorno_consenso)
     """
     if semilla is not None:
-        np.random.seed(semilla)
         random.seed(semilla)
     
-    # Crear robots (mismas posiciones para ambos)
-    robots_greedy = []
-    robots_consenso = []
+    # Crear robots
+    robots = []
     for i in range(num_robots):
         posicion_inicial = generar_posicion_aleatoria(dimensiones)
         
-        robot_g = Robot(
+        robot = Robot(
             id_robot=i,
             posicion_inicial=posicion_inicial,
             capacidad=capacidad,
             rango_percepcion=rango_percepcion,
             rango_comunicacion=rango_comunicacion
         )
-        robots_greedy.append(robot_g)
-        
-        robot_c = Robot(
-            id_robot=i,
-            posicion_inicial=posicion_inicial,
-            capacidad=capacidad,
-            rango_percepcion=rango_percepcion,
-            rango_comunicacion=rango_comunicacion
-        )
-        robots_consenso.append(robot_c)
+        robots.append(robot)
     
-    # Crear tareas (mismas para ambos)
-    tareas_greedy = []
-    tareas_consenso = []
+    # Crear tareas
+    tareas = []
     for j in range(num_tareas):
         posicion_pickup = generar_posicion_aleatoria(dimensiones)
         posicion_delivery = generar_posicion_aleatoria(dimensiones)
@@ -78,40 +62,28 @@ def crear_entorno_comun(num_robots: int = 5,
         while posicion_delivery == posicion_pickup:
             posicion_delivery = generar_posicion_aleatoria(dimensiones)
         
-        tarea_g = Tarea(
+        tarea = Tarea(
             id_tarea=j,
             posicion_pickup=posicion_pickup,
             posicion_delivery=posicion_delivery,
             posicion_real_pickup=posicion_pickup,
             posicion_real_delivery=posicion_delivery
         )
-        tareas_greedy.append(tarea_g)
-        
-        tarea_c = Tarea(
-            id_tarea=j,
-            posicion_pickup=posicion_pickup,
-            posicion_delivery=posicion_delivery,
-            posicion_real_pickup=posicion_pickup,
-            posicion_real_delivery=posicion_delivery
-        )
-        tareas_consenso.append(tarea_c)
+        tareas.append(tarea)
     
-    # Crear entornos
+    # Crear entornos: el de consenso es una copia independiente del de greedy (mismos robots y tareas)
     entorno_greedy = Entorno(
         dimensiones=dimensiones,
-        robots=robots_greedy,
-        tareas=tareas_greedy,
+        robots=robots,
+        tareas=tareas,
         ruido_percepcion=ruido_percepcion,
-        probabilidad_fallo_comunicacion=probabilidad_fallo_comunicacion
+        probabilidad_fallo_comunicacion=probabilidad_fallo_comunicacion,
+        semilla=semilla
     )
     
-    entorno_consenso = Entorno(
-        dimensiones=dimensiones,
-        robots=robots_consenso,
-        tareas=tareas_consenso,
-        ruido_percepcion=ruido_percepcion,
-        probabilidad_fallo_comunicacion=probabilidad_fallo_comunicacion
-    )
+    # Generador propio con la misma semilla: ambos algoritmos ven la misma secuencia de ruido
+    # y fallos sin que lo que consume uno afecte al otro
+    entorno_consenso = entorno_greedy.clonar(rng=np.random.default_rng(semilla))
     
     return entorno_greedy, entorno_consenso
 
@@ -162,9 +134,8 @@ def comparar_algoritmos(ruido_percepcion: float = 0.0,
     # Ejecutar Algoritmo 2 (Consenso)
     algoritmo_consenso = AlgoritmoConsensoIncertidumbre(
         entorno_consenso,
-        epsilon=0.2,
         lambda_penalizacion=0.3,
-        iteraciones_consenso=5,
+        iteraciones_consenso=3,
         sigma_umbral=2.0
     )
     rondas_consenso = algoritmo_consenso.ejecutar(max_rondas=1000)
@@ -177,6 +148,7 @@ def comparar_algoritmos(ruido_percepcion: float = 0.0,
         print(f"  Distancia total: {metricas_greedy['distancia_total']}")
         print(f"  Tasa completitud: {metricas_greedy['tasa_completitud']:.2%}")
         print(f"  Balance carga: {metricas_greedy['balance_carga']:.2f}")
+        imprimir_estado_final(entorno_greedy, sangria="  ")
         
         print("\nALGORITMO 2 (Consenso con Incertidumbre):")
         print(f"  Rondas: {metricas_consenso['rondas_ejecutadas']}")
@@ -185,6 +157,7 @@ def comparar_algoritmos(ruido_percepcion: float = 0.0,
         print(f"  Balance carga: {metricas_consenso['balance_carga']:.2f}")
         if metricas_consenso.get('error_estimacion', 0) > 0:
             print(f"  Error estimación: {metricas_consenso['error_estimacion']:.2f}")
+        imprimir_estado_final(entorno_consenso, sangria="  ")
         
         print("\nCOMPARACIÓN:")
         print(f"  Diferencia rondas: {metricas_consenso['rondas_ejecutadas'] - metricas_greedy['rondas_ejecutadas']}")
@@ -197,185 +170,148 @@ def comparar_algoritmos(ruido_percepcion: float = 0.0,
     }
 
 
-def guardar_resultados(resultados: Dict, nombre_archivo: str):
+def ejecutar_barrido(escenarios: Dict[str, Dict], num_semillas: int = 10) -> Dict[str, List[Dict]]:
+    """
+    Compara ambos algoritmos en varios escenarios con las semillas 0..num_semillas-1 en un único pool de procesos.
+    
+    Todas las comparaciones (escenarios x semillas) se envían juntas y son independientes
+    (entornos y semilla propios), por lo que los resultados son los mismos que en una
+    ejecución secuencial.
+    
+    Args:
+        escenarios: Diccionario {nombre: parámetros de comparar_algoritmos}
+        num_semillas: Número de ejecuciones (semillas) por escenario
+        
+    Returns:
+        Diccionario {nombre: lista con el resultado de cada comparación, ordenada por semilla}
+    """
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as ejecutor:
+        futuros = {
+            nombre: [ejecutor.submit(comparar_algoritmos, semilla=semilla, verbose=False, **parametros)
+                     for semilla in range(num_semillas)]
+            for nombre, parametros in escenarios.items()
+        }
+        return {nombre: [futuro.result() for futuro in lista] for nombre, lista in futuros.items()}
+
+
+def guardar_resultados(resultados: Dict, nombre_archivo: str, fecha: Optional[datetime] = None):
     """
     Guarda los resultados en un archivo de texto.
     
     Args:
         resultados: Diccionario con los resultados de los experimentos
         nombre_archivo: Nombre del archivo donde guardar
+        fecha: Fecha de ejecución para la cabecera (si es None, la actual)
     """
+    if fecha is None:
+        fecha = datetime.now()
+    
     # Crear directorio de resultados si no existe
     directorio_resultados = "resultados"
-    if not os.path.exists(directorio_resultados):
-        os.makedirs(directorio_resultados)
+    os.makedirs(directorio_resultados, exist_ok=True)
     
     ruta_archivo = os.path.join(directorio_resultados, nombre_archivo)
     
-    with open(ruta_archivo, 'w', encoding='utf-8') as f:
-        f.write("="*80 + "\n")
-        f.write("CASO DE USO 3: Comparación Directa entre Algoritmos\n")
-        f.write("="*80 + "\n")
-        f.write(f"Fecha de ejecución: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        f.write("="*80 + "\n\n")
+    # El reporte se compone en memoria y se escribe con una sola llamada
+    partes = []
+    partes.append("="*80 + "\n")
+    partes.append("CASO DE USO 3: Comparación Directa entre Algoritmos\n")
+    partes.append("="*80 + "\n")
+    partes.append(f"Fecha de ejecución: {fecha.strftime('%Y-%m-%d %H:%M:%S')}\n")
+    partes.append("="*80 + "\n\n")
+    
+    for escenario_nombre, escenario_resultados in resultados.items():
+        partes.append("\n" + "="*80 + "\n")
+        partes.append(f"{escenario_nombre.upper().replace('_', ' ')}\n")
+        partes.append("="*80 + "\n\n")
         
-        for escenario_nombre, escenario_resultados in resultados.items():
-            f.write("\n" + "="*80 + "\n")
-            f.write(f"{escenario_nombre.upper().replace('_', ' ')}\n")
-            f.write("="*80 + "\n\n")
+        if escenario_resultados:
+            # Métricas de todas las ejecuciones como matrices (ejecuciones x métricas), en una pasada
+            claves_greedy = sorted(escenario_resultados[0]['greedy'].keys())
+            claves_consenso = sorted(escenario_resultados[0]['consenso'].keys())
+            greedy = np.array([[r['greedy'][key] for key in claves_greedy]
+                               for r in escenario_resultados], dtype=float)
+            consenso = np.array([[r['consenso'][key] for key in claves_consenso]
+                                 for r in escenario_resultados], dtype=float)
             
-            if escenario_resultados:
-                # Calcular estadísticas para Greedy
-                promedios_greedy = {}
-                desviaciones_greedy = {}
-                for key in escenario_resultados[0]['greedy'].keys():
-                    valores = [r['greedy'][key] for r in escenario_resultados]
-                    promedios_greedy[key] = np.mean(valores)
-                    desviaciones_greedy[key] = np.std(valores)
-                
-                # Calcular estadísticas para Consenso
-                promedios_consenso = {}
-                desviaciones_consenso = {}
-                for key in escenario_resultados[0]['consenso'].keys():
-                    valores = [r['consenso'][key] for r in escenario_resultados]
-                    promedios_consenso[key] = np.mean(valores)
-                    desviaciones_consenso[key] = np.std(valores)
-                
-                f.write("ALGORITMO 1 (Greedy Distribuido) - Promedio (10 ejecuciones):\n")
-                f.write("-"*80 + "\n")
-                for key in sorted(promedios_greedy.keys()):
-                    f.write(f"  {key:30s}: {promedios_greedy[key]:10.2f} ± {desviaciones_greedy[key]:.2f}\n")
-                
-                f.write("\nALGORITMO 2 (Consenso con Incertidumbre) - Promedio (10 ejecuciones):\n")
-                f.write("-"*80 + "\n")
-                for key in sorted(promedios_consenso.keys()):
-                    f.write(f"  {key:30s}: {promedios_consenso[key]:10.2f} ± {desviaciones_consenso[key]:.2f}\n")
-                
-                f.write("\nCOMPARACIÓN (Consenso - Greedy):\n")
-                f.write("-"*80 + "\n")
-                for key in sorted(promedios_greedy.keys()):
-                    if key in promedios_consenso:
-                        diferencia = promedios_consenso[key] - promedios_greedy[key]
-                        f.write(f"  {key:30s}: {diferencia:10.2f}\n")
-                
-                f.write("\nResultados individuales:\n")
-                f.write("-"*80 + "\n")
-                for i, resultado in enumerate(escenario_resultados):
-                    f.write(f"\nEjecución {i+1}:\n")
-                    f.write("  Greedy:\n")
-                    for key in sorted(resultado['greedy'].keys()):
-                        f.write(f"    {key:30s}: {resultado['greedy'][key]:10.2f}\n")
-                    f.write("  Consenso:\n")
-                    for key in sorted(resultado['consenso'].keys()):
-                        f.write(f"    {key:30s}: {resultado['consenso'][key]:10.2f}\n")
-        
-        f.write("\n" + "="*80 + "\n")
-        f.write("FIN DEL REPORTE\n")
-        f.write("="*80 + "\n")
+            # Calcular estadísticas de ambos algoritmos
+            promedios_greedy, desviaciones_greedy = greedy.mean(axis=0), greedy.std(axis=0)
+            promedios_consenso, desviaciones_consenso = consenso.mean(axis=0), consenso.std(axis=0)
+            
+            partes.append("ALGORITMO 1 (Greedy Distribuido) - Promedio (10 ejecuciones):\n")
+            partes.append("-"*80 + "\n")
+            for key, promedio, desviacion in zip(claves_greedy, promedios_greedy, desviaciones_greedy):
+                partes.append(f"  {key:30s}: {promedio:10.2f} ± {desviacion:.2f}\n")
+            
+            partes.append("\nALGORITMO 2 (Consenso con Incertidumbre) - Promedio (10 ejecuciones):\n")
+            partes.append("-"*80 + "\n")
+            for key, promedio, desviacion in zip(claves_consenso, promedios_consenso, desviaciones_consenso):
+                partes.append(f"  {key:30s}: {promedio:10.2f} ± {desviacion:.2f}\n")
+            
+            partes.append("\nCOMPARACIÓN (Consenso - Greedy):\n")
+            partes.append("-"*80 + "\n")
+            columna_consenso = {key: j for j, key in enumerate(claves_consenso)}
+            for key, promedio in zip(claves_greedy, promedios_greedy):
+                if key in columna_consenso:
+                    diferencia = promedios_consenso[columna_consenso[key]] - promedio
+                    partes.append(f"  {key:30s}: {diferencia:10.2f}\n")
+            
+            partes.append("\nResultados individuales:\n")
+            partes.append("-"*80 + "\n")
+            for i, (fila_greedy, fila_consenso) in enumerate(zip(greedy, consenso)):
+                partes.append(f"\nEjecución {i+1}:\n")
+                partes.append("  Greedy:\n")
+                for key, valor in zip(claves_greedy, fila_greedy):
+                    partes.append(f"    {key:30s}: {valor:10.2f}\n")
+                partes.append("  Consenso:\n")
+                for key, valor in zip(claves_consenso, fila_consenso):
+                    partes.append(f"    {key:30s}: {valor:10.2f}\n")
+    
+    partes.append("\n" + "="*80 + "\n")
+    partes.append("FIN DEL REPORTE\n")
+    partes.append("="*80 + "\n")
+    
+    with open(ruta_archivo, 'w', encoding='utf-8') as f:
+        f.write(''.join(partes))
     
     print(f"\n✓ Resultados guardados en: {ruta_archivo}")
 
 
 def ejecutar_caso_uso_3():
     """Ejecuta todos los experimentos del Caso de uso 3."""
-    resultados = {}
-    
-    # Escenario 3.1: Sin incertidumbre
-    print("\n" + "="*60)
-    print("ESCENARIO 3.1: Sin incertidumbre (condiciones ideales para Algoritmo 1)")
-    print("="*60)
-    resultados_3_1 = []
-    for semilla in range(10):
-        resultado = comparar_algoritmos(
-            ruido_percepcion=0.0,
-            probabilidad_fallo_comunicacion=0.0,
-            semilla=semilla,
-            verbose=False
-        )
-        resultados_3_1.append(resultado)
-    
-    resultados['escenario_3_1'] = resultados_3_1
-    
-    # Calcular promedios
-    print("\nResultados promedio Algoritmo 1 (10 ejecuciones):")
-    promedios_greedy = {}
-    for key in resultados_3_1[0]['greedy'].keys():
-        valores = [r['greedy'][key] for r in resultados_3_1]
-        promedios_greedy[key] = np.mean(valores)
-        print(f"  {key}: {promedios_greedy[key]:.2f}")
-    
-    print("\nResultados promedio Algoritmo 2 (10 ejecuciones):")
-    promedios_consenso = {}
-    for key in resultados_3_1[0]['consenso'].keys():
-        valores = [r['consenso'][key] for r in resultados_3_1]
-        promedios_consenso[key] = np.mean(valores)
-        print(f"  {key}: {promedios_consenso[key]:.2f}")
-    
-    # Escenario 3.2: Incertidumbre moderada
-    print("\n" + "="*60)
-    print("ESCENARIO 3.2: Incertidumbre moderada (σ = 0.5)")
-    print("="*60)
-    resultados_3_2 = []
-    for semilla in range(10):
-        resultado = comparar_algoritmos(
-            ruido_percepcion=0.5,
-            probabilidad_fallo_comunicacion=0.1,
-            semilla=semilla,
-            verbose=False
-        )
-        resultados_3_2.append(resultado)
-    
-    resultados['escenario_3_2'] = resultados_3_2
-    
-    # Calcular promedios
-    print("\nResultados promedio Algoritmo 1 (10 ejecuciones):")
-    promedios_greedy = {}
-    for key in resultados_3_2[0]['greedy'].keys():
-        valores = [r['greedy'][key] for r in resultados_3_2]
-        promedios_greedy[key] = np.mean(valores)
-        print(f"  {key}: {promedios_greedy[key]:.2f}")
-    
-    print("\nResultados promedio Algoritmo 2 (10 ejecuciones):")
-    promedios_consenso = {}
-    for key in resultados_3_2[0]['consenso'].keys():
-        valores = [r['consenso'][key] for r in resultados_3_2]
-        promedios_consenso[key] = np.mean(valores)
-        print(f"  {key}: {promedios_consenso[key]:.2f}")
-    
-    # Escenario 3.3: Incertidumbre alta
-    print("\n" + "="*60)
-    print("ESCENARIO 3.3: Incertidumbre alta (σ = 1.5)")
-    print("="*60)
-    resultados_3_3 = []
-    for semilla in range(10):
-        resultado = comparar_algoritmos(
-            ruido_percepcion=1.5,
-            probabilidad_fallo_comunicacion=0.1,
-            semilla=semilla,
-            verbose=False
-        )
-        resultados_3_3.append(resultado)
-    
-    resultados['escenario_3_3'] = resultados_3_3
+    # Escenarios: {nombre: (título, parámetros)}
+    escenarios = {
+        'escenario_3_1': ("ESCENARIO 3.1: Sin incertidumbre (condiciones ideales para Algoritmo 1)",
+                          {'ruido_percepcion': 0.0, 'probabilidad_fallo_comunicacion': 0.0}),
+        'escenario_3_2': ("ESCENARIO 3.2: Incertidumbre moderada (σ = 0.5)",
+                          {'ruido_percepcion': 0.5, 'probabilidad_fallo_comunicacion': 0.1}),
+        'escenario_3_3': ("ESCENARIO 3.3: Incertidumbre alta (σ = 1.5)",
+                          {'ruido_percepcion': 1.5, 'probabilidad_fallo_comunicacion': 0.1}),
+    }
     
-    # Calcular promedios
-    print("\nResultados promedio Algoritmo 1 (10 ejecuciones):")
-    promedios_greedy = {}
-    for key in resultados_3_3[0]['greedy'].keys():
-        valores = [r['greedy'][key] for r in resultados_3_3]
-        promedios_greedy[key] = np.mean(valores)
-        print(f"  {key}: {promedios_greedy[key]:.2f}")
+    # Las 30 comparaciones (3 escenarios x 10 semillas) se reparten en un único pool
+    resultados = ejecutar_barrido({nombre: parametros for nombre, (_, parametros) in escenarios.items()})
     
-    print("\nResultados promedio Algoritmo 2 (10 ejecuciones):")
-    promedios_consenso = {}
-    for key in resultados_3_3[0]['consenso'].keys():
-        valores = [r['consenso'][key] for r in resultados_3_3]
-        promedios_consenso[key] = np.mean(valores)
-        print(f"  {key}: {promedios_consenso[key]:.2f}")
+    for nombre, (titulo, _) in escenarios.items():
+        print("\n" + "="*60)
+        print(titulo)
+        print("="*60)
+        
+        # Calcular promedios
+        print("\nResultados promedio Algoritmo 1 (10 ejecuciones):")
+        promedios_greedy, _ = calcular_estadisticas([r['greedy'] for r in resultados[nombre]])
+        for key, promedio in promedios_greedy.items():
+            print(f"  {key}: {promedio:.2f}")
+        
+        print("\nResultados promedio Algoritmo 2 (10 ejecuciones):")
+        promedios_consenso, _ = calcular_estadisticas([r['consenso'] for r in resultados[nombre]])
+        for key, promedio in promedios_consenso.items():
+            print(f"  {key}: {promedio:.2f}")
     
     # Guardar resultados
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    guardar_resultados(resultados, f"caso_uso_3_{timestamp}.txt")
+    # Una sola fecha para el nombre del archivo y la cabecera del reporte
+    fecha = datetime.now()
+    guardar_resultados(resultados, f"caso_uso_3_{fecha.strftime('%Y%m%d_%H%M%S')}.txt", fecha)
     
     return resultados
 
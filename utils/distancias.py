@@ -0,0 +1,69 @@
+"""
+Funciones de distancia de Manhattan, entre dos posiciones o vectorizadas sobre matrices de posiciones (n x 2).
+"""
+from typing import Tuple
+import numpy as np
+
+
+def distancia_manhattan(pos1: Tuple[int, int], pos2: Tuple[int, int]) -> int:
+    """Calcula la distancia de Manhattan entre dos posiciones."""
+    return abs(pos1[0] - pos2[0]) + abs(pos1[1] - pos2[1])
+
+
+def distancias_manhattan(origenes: np.ndarray, destinos: np.ndarray) -> np.ndarray:
+    """
+    Calcula la distancia de Manhattan entre cada origen y cada destino.
+    
+    Args:
+        origenes: Matriz de posiciones (n x 2)
+        destinos: Matriz de posiciones (m x 2)
+    
+    Returns:
+        Matriz (n x m) de distancias
+    """
+    return (np.abs(origenes[:, 0, None] - destinos[None, :, 0])
+            + np.abs(origenes[:, 1, None] - destinos[None, :, 1]))
+
+
+def distancias_desde(origen: np.ndarray, destinos: np.ndarray) -> np.ndarray:
+    """
+    Calcula la distancia de Manhattan desde un origen a cada destino.
+    
+    Args:
+        origen: Posición (x, y)
+        destinos: Matriz de posiciones (m x 2)
+    
+    Returns:
+        Vector (m,) de distancias
+    """
+    return np.abs(destinos[:, 0] - origen[0]) + np.abs(destinos[:, 1] - origen[1])
+
+
+def distancias_por_filas(posiciones1: np.ndarray, posiciones2: np.ndarray) -> np.ndarray:
+    """
+    Calcula la distancia de Manhattan entre cada fila de una matriz y la misma fila de otra.
+    
+    Args:
+        posiciones1: Matriz de posiciones (m x 2)
+        posiciones2: Matriz de posiciones (m x 2)
+    
+    Returns:
+        Vector (m,) de distancias
+    """
+    return np.abs(posiciones1 - posiciones2).sum(axis=1)
+
+
+def costes_totales(posiciones: np.ndarray, pickups: np.ndarray, deliveries: np.ndarray) -> np.ndarray:
+    """
+    Calcula el coste de cada robot para cada tarea (igual que Tarea.coste_total).
+    
+    Args:
+        posiciones: Posiciones de los robots (n x 2)
+        pickups: Posiciones de recogida de las tareas (m x 2)
+        deliveries: Posiciones de entrega de las tareas (m x 2)
+    
+    Returns:
+        Matriz (n x m) con la distancia robot -> pickup -> delivery
+    """
+    trayecto = np.abs(pickups - deliveries).sum(axis=1)
+    return distancias_manhattan(posiciones, pickups) + trayecto[None, :]
@@ -1,21 +1,50 @@
 """
 Clase para representar el entorno de simulación.
 """
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, Optional, NamedTuple
 import numpy as np
 from utils.robot import Robot
-from utils.tarea import Tarea, EstadoTarea
+from utils.tarea import Tarea, ESTADO_COMPLETADA
+from utils.distancias import distancias_manhattan, distancias_desde, costes_totales
+
+
+class Detecciones(NamedTuple):
+    """Detecciones de una ronda como arrays paralelos, un elemento por par (robot, tarea) detectado."""
+    robots: np.ndarray    # ID del robot que detecta (ordenado)
+    tareas: np.ndarray    # ID de la tarea detectada
+    pickup: np.ndarray    # Posición de recogida observada (k x 2)
+    delivery: np.ndarray  # Posición de entrega observada (k x 2)
+    
+    def ids_por_robot(self, num_robots: int) -> List[List[int]]:
+        """Agrupa los IDs de las tareas detectadas por ID de robot."""
+        limites = np.searchsorted(self.robots, np.arange(1, num_robots))
+        return [ids.tolist() for ids in np.split(self.tareas, limites)]
+
+
+# Registro de cada ronda en el historial del entorno (ver Entorno.historial_arrays)
+TIPO_HISTORIAL = np.dtype([('ronda', np.int32), ('tareas_completadas', np.int32), ('distancia_total', np.int64)])
 
 
 class Entorno:
     """Representa el entorno de simulación para el sistema multi-robot."""
     
+    __slots__ = ('dimensiones', 'robots', 'tareas', 'ruido_percepcion', 'probabilidad_fallo_comunicacion',
+                 'rng', 'indice_tareas', 'ids_tareas', 'robot_pos', 'tarea_pickup', 'tarea_delivery',
+                 'tarea_real_pickup', 'tarea_real_delivery', 'tarea_estado',
+                 'robot_distancia', 'robot_completadas', '_costes', '_posiciones_costes',
+                 '_grafo_comunicacion', '_version_grafo', '_observar_posiciones',
+                 'version_topologia', '_posiciones_topologia', 'ronda_actual',
+                 '_historial', '_historial_tareas_por_robot', '_rondas_historial')
+    
     def __init__(self,
                  dimensiones: Tuple[int, int] = (10, 10),
                  robots: List[Robot] = None,
                  tareas: List[Tarea] = None,
                  ruido_percepcion: float = 0.0,
-                 probabilidad_fallo_comunicacion: float = 0.0):
+                 probabilidad_fallo_comunicacion: float = 0.0,
+                 rng: Optional[np.random.Generator] = None,
+                 max_rondas: int = 1000,
+                 semilla: Optional[int] = None):
         """
         Inicializa el entorno.
         
@@ -25,16 +54,177 @@ class Entorno:
             tareas: Lista de tareas en el entorno
             ruido_percepcion: Desviación estándar del ruido gaussiano en la percepción
             probabilidad_fallo_comunicacion: Probabilidad de que un mensaje falle
+            rng: Generador aleatorio para el ruido y los fallos (si es None, se crea uno con la semilla)
+            max_rondas: Rondas reservadas de antemano en el historial (se amplía si se superan)
+            semilla: Semilla del generador propio del entorno (solo si rng es None)
         """
         self.dimensiones = dimensiones
         self.robots = robots if robots else []
-        self.tareas = {t.id_tarea: t for t in (tareas if tareas else [])}
+        self.tareas = sorted(tareas if tareas else [], key=lambda t: t.id_tarea)  # Por ID (ver obtener_tarea)
         self.ruido_percepcion = ruido_percepcion
         self.probabilidad_fallo_comunicacion = probabilidad_fallo_comunicacion
+        self.rng = rng if rng is not None else np.random.default_rng(semilla)
+        
+        # Variante de la observación según haya ruido o no, elegida una sola vez al crear el entorno
+        if ruido_percepcion > 0:
+            self._observar_posiciones = self._posiciones_con_ruido
+        else:
+            self._observar_posiciones = self._posiciones_exactas
+        
+        # Posiciones como matrices (estructura de arrays), sincronizadas con los objetos:
+        # fila i de robot_pos = robots[i].posicion, fila j de tarea_pickup/tarea_delivery =
+        # posiciones estimadas de la j-ésima tarea de self.tareas
+        self.indice_tareas = {tarea.id_tarea: fila for fila, tarea in enumerate(self.tareas)}
+        self.ids_tareas = np.array([tarea.id_tarea for tarea in self.tareas], dtype=np.intp)
+        self._vincular_posiciones(np.zeros((len(self.robots), 2), dtype=np.int32),
+                                  np.zeros((len(self.tareas), 2), dtype=np.int32),
+                                  np.zeros((len(self.tareas), 2), dtype=np.int32))
+        
+        # Las posiciones reales no cambian: base de las observaciones con ruido
+        self.tarea_real_pickup = np.array([t.posicion_real_pickup for t in self.tareas],
+                                          dtype=np.int32).reshape(-1, 2)
+        self.tarea_real_delivery = np.array([t.posicion_real_delivery for t in self.tareas],
+                                            dtype=np.int32).reshape(-1, 2)
+        
+        # Estado de cada tarea como código ESTADO_* (misma fila que en las matrices de posiciones)
+        self.tarea_estado = np.zeros(len(self.tareas), dtype=np.int8)
+        for fila, tarea in enumerate(self.tareas):
+            tarea.vincular_estado(self.tarea_estado, fila)
+        
+        # Estadísticas de cada robot, actualizadas por el propio robot al moverse y completar tareas
+        self.robot_distancia = np.zeros(len(self.robots), dtype=np.int64)
+        self.robot_completadas = np.zeros(len(self.robots), dtype=np.int32)
+        for robot in self.robots:
+            robot.vincular_estadisticas(self.robot_distancia, self.robot_completadas)
+        
+        # Matriz de costes robot-tarea y posiciones con las que se calculó (ver matriz_costes)
+        self._costes: Optional[np.ndarray] = None
+        self._posiciones_costes: Tuple[np.ndarray, ...] = ()
         
-        # Estadísticas
+        # Versión del grafo de comunicación (cambia al moverse los robots o si hay fallos)
+        self.version_topologia = 0
+        self._grafo_comunicacion: Optional[np.ndarray] = None
+        self._version_grafo = -1
+        
+        # Estadísticas: una fila por ronda avanzada, en matrices reservadas de antemano
         self.ronda_actual = 0
-        self.historial: List[Dict] = []
+        self._historial = np.zeros(max_rondas, dtype=TIPO_HISTORIAL)
+        self._historial_tareas_por_robot = np.zeros((max_rondas, len(self.robots)), dtype=np.int32)
+        self._rondas_historial = 0
+    
+    @classmethod
+    def desde_arrays(cls,
+                     robot_pos: np.ndarray,
+                     tarea_pickup: np.ndarray,
+                     tarea_delivery: np.ndarray,
+                     dimensiones: Tuple[int, int] = (10, 10),
+                     ruido_percepcion: float = 0.0,
+                     probabilidad_fallo_comunicacion: float = 0.0,
+                     rng: Optional[np.random.Generator] = None,
+                     capacidad: int = 1,
+                     rango_percepcion: int = 3,
+                     rango_comunicacion: int = 5) -> 'Entorno':
+        """
+        Crea un entorno a partir de matrices de posiciones, sin construir las listas a mano.
+        
+        Los robots y las tareas reciben ids consecutivos según su fila, y las matrices
+        (si ya son int32 contiguas) pasan a ser las del entorno sin copiarse.
+        
+        Args:
+            robot_pos: Posiciones iniciales de los robots (matriz n x 2)
+            tarea_pickup: Posiciones reales de recogida (matriz m x 2)
+            tarea_delivery: Posiciones reales de entrega (matriz m x 2)
+            dimensiones: Dimensiones del espacio (ancho, alto)
+            ruido_percepcion: Desviación estándar del ruido gaussiano en la percepción
+            probabilidad_fallo_comunicacion: Probabilidad de que un mensaje falle
+            rng: Generador aleatorio para el ruido y los fallos
+            capacidad: Capacidad de cada robot
+            rango_percepcion: Rango de percepción de cada robot
+            rango_comunicacion: Rango de comunicación de cada robot
+            
+        Returns:
+            Entorno con robots y tareas en el orden de las filas
+        """
+        robot_pos = np.ascontiguousarray(robot_pos, dtype=np.int32)
+        tarea_pickup = np.ascontiguousarray(tarea_pickup, dtype=np.int32)
+        tarea_delivery = np.ascontiguousarray(tarea_delivery, dtype=np.int32)
+        
+        robots = [Robot(id_robot=i,
+                        posicion_inicial=tuple(posicion),
+                        capacidad=capacidad,
+                        rango_percepcion=rango_percepcion,
+                        rango_comunicacion=rango_comunicacion)
+                  for i, posicion in enumerate(robot_pos.tolist())]
+        tareas = [Tarea(id_tarea=j, posicion_pickup=tuple(pickup), posicion_delivery=tuple(delivery))
+                  for j, (pickup, delivery) in enumerate(zip(tarea_pickup.tolist(), tarea_delivery.tolist()))]
+        
+        entorno = cls(dimensiones=dimensiones,
+                      robots=robots,
+                      tareas=tareas,
+                      ruido_percepcion=ruido_percepcion,
+                      probabilidad_fallo_comunicacion=probabilidad_fallo_comunicacion,
+                      rng=rng)
+        entorno._vincular_posiciones(robot_pos, tarea_pickup, tarea_delivery)
+        return entorno
+    
+    def clonar(self, rng: Optional[np.random.Generator] = None) -> 'Entorno':
+        """
+        Crea un entorno independiente con los mismos robots, tareas y parámetros que este.
+        
+        Se copian las posiciones actuales (a partir de las matrices del entorno) y los
+        parámetros de cada robot y tarea; el progreso de la simulación (estados, cargas,
+        estadísticas, historial) empieza de cero en la copia.
+        
+        Args:
+            rng: Generador aleatorio de la copia (si es None, comparte el de este entorno)
+            
+        Returns:
+            Entorno nuevo que no comparte robots, tareas ni matrices con este
+        """
+        robots = [Robot(id_robot=robot.id_robot,
+                        posicion_inicial=tuple(posicion),
+                        capacidad=robot.capacidad,
+                        rango_percepcion=robot.rango_percepcion,
+                        rango_comunicacion=robot.rango_comunicacion)
+                  for robot, posicion in zip(self.robots, self.robot_pos.tolist())]
+        tareas = [Tarea(id_tarea=tarea_id,
+                        posicion_pickup=tuple(pickup),
+                        posicion_delivery=tuple(delivery),
+                        posicion_real_pickup=tuple(real_pickup),
+                        posicion_real_delivery=tuple(real_delivery))
+                  for tarea_id, pickup, delivery, real_pickup, real_delivery
+                  in zip(self.ids_tareas.tolist(), self.tarea_pickup.tolist(), self.tarea_delivery.tolist(),
+                         self.tarea_real_pickup.tolist(), self.tarea_real_delivery.tolist())]
+        
+        return Entorno(dimensiones=self.dimensiones,
+                       robots=robots,
+                       tareas=tareas,
+                       ruido_percepcion=self.ruido_percepcion,
+                       probabilidad_fallo_comunicacion=self.probabilidad_fallo_comunicacion,
+                       rng=self.rng if rng is None else rng)
+    
+    def obtener_tarea(self, tarea_id: int) -> Tarea:
+        """
+        Obtiene una tarea por su ID.
+        
+        Args:
+            tarea_id: ID de la tarea
+            
+        Returns:
+            La tarea con ese ID (KeyError si no existe)
+        """
+        return self.tareas[self.indice_tareas[tarea_id]]
+    
+    def _vincular_posiciones(self, robot_pos: np.ndarray, tarea_pickup: np.ndarray, tarea_delivery: np.ndarray):
+        """Usa las matrices dadas como almacenamiento de las posiciones de robots y tareas."""
+        self.robot_pos = robot_pos
+        self.tarea_pickup = tarea_pickup
+        self.tarea_delivery = tarea_delivery
+        for fila, robot in enumerate(self.robots):
+            robot.vincular_posicion(self.robot_pos, fila)
+        for fila, tarea in enumerate(self.tareas):
+            tarea.vincular_posiciones(self.tarea_pickup, self.tarea_delivery, fila)
+        self._posiciones_topologia = self.robot_pos.copy()
     
     def obtener_vecinos_comunicacion(self, robot_id: int) -> List[Robot]:
         """
@@ -46,14 +236,52 @@ class Entorno:
         Returns:
             Lista de robots vecinos (excluyendo el propio robot)
         """
-        robot = self.robots[robot_id]
-        vecinos = []
-        for otro_robot in self.robots:
-            if otro_robot.id_robot != robot_id and robot.puede_comunicarse_con(otro_robot):
-                # Simular fallo de comunicación
-                if np.random.random() > self.probabilidad_fallo_comunicacion:
-                    vecinos.append(otro_robot)
-        return vecinos
+        return [self.robots[i] for i in np.flatnonzero(self.grafo_comunicacion()[robot_id]).tolist()]
+    
+    def grafo_comunicacion(self) -> np.ndarray:
+        """
+        Devuelve la matriz de adyacencia de la comunicación de la ronda actual.
+        
+        La fila i indica los robots de los que el robot i recibe mensajes en esta ronda:
+        los que están en su rango de comunicación y cuyo mensaje no ha fallado. Los fallos
+        se generan de una vez para todos los pares y la matriz se reutiliza hasta que
+        cambia version_topologia (ver avanzar_ronda).
+        
+        Returns:
+            Matriz booleana (robots x robots), sin la diagonal
+        """
+        if self._grafo_comunicacion is None or self._version_grafo != self.version_topologia:
+            rangos = np.array([robot.rango_comunicacion for robot in self.robots])
+            
+            # Misma condición que Robot.puede_comunicarse_con, para todos los pares
+            grafo = distancias_manhattan(self.robot_pos, self.robot_pos) <= rangos[:, None]
+            np.fill_diagonal(grafo, False)
+            
+            # Simular fallo de comunicación (independiente para cada par emisor-receptor)
+            if self.probabilidad_fallo_comunicacion > 0:
+                grafo &= self.rng.random(grafo.shape) > self.probabilidad_fallo_comunicacion
+            
+            self._grafo_comunicacion = grafo
+            self._version_grafo = self.version_topologia
+        return self._grafo_comunicacion
+    
+    def matriz_costes(self) -> np.ndarray:
+        """
+        Devuelve la matriz de costes (robots x tareas) de Tarea.coste_total para todos los pares.
+        
+        La matriz se guarda y solo se recalcula si alguna posición de robot o tarea ha
+        cambiado desde la última llamada. No debe modificarse (es de solo lectura).
+        
+        Returns:
+            Matriz con la distancia robot -> pickup -> delivery, columnas en el orden de indice_tareas
+        """
+        posiciones = (self.robot_pos, self.tarea_pickup, self.tarea_delivery)
+        if self._costes is None or not all(np.array_equal(actual, guardada) for actual, guardada
+                                           in zip(posiciones, self._posiciones_costes)):
+            self._costes = costes_totales(*posiciones)
+            self._costes.flags.writeable = False
+            self._posiciones_costes = tuple(p.copy() for p in posiciones)
+        return self._costes
     
     def detectar_tareas(self, robot_id: int) -> List[Tarea]:
         """
@@ -66,56 +294,151 @@ class Entorno:
             Lista de tareas detectadas (con ruido si aplica)
         """
         robot = self.robots[robot_id]
-        tareas_detectadas = []
-        
-        for tarea in self.tareas.values():
-            if robot.puede_detectar_tarea(tarea):
-                # Crear una copia de la tarea con posible ruido
-                if self.ruido_percepcion > 0:
-                    # Añadir ruido gaussiano
-                    ruido_x = np.random.normal(0, self.ruido_percepcion)
-                    ruido_y = np.random.normal(0, self.ruido_percepcion)
-                    
-                    pickup_estimado = (
-                        int(round(tarea.posicion_real_pickup[0] + ruido_x)),
-                        int(round(tarea.posicion_real_pickup[1] + ruido_y))
-                    )
-                    delivery_estimado = (
-                        int(round(tarea.posicion_real_delivery[0] + ruido_x)),
-                        int(round(tarea.posicion_real_delivery[1] + ruido_y))
-                    )
-                    
-                    # Crear tarea con estimación
-                    tarea_detectada = Tarea(
-                        id_tarea=tarea.id_tarea,
-                        posicion_pickup=pickup_estimado,
-                        posicion_delivery=delivery_estimado,
-                        posicion_real_pickup=tarea.posicion_real_pickup,
-                        posicion_real_delivery=tarea.posicion_real_delivery
-                    )
-                    tarea_detectada.estado = tarea.estado
-                    tareas_detectadas.append(tarea_detectada)
-                else:
-                    tareas_detectadas.append(tarea)
-        
-        return tareas_detectadas
+        
+        # Misma condición que Robot.puede_detectar_tarea, para todas las tareas a la vez
+        distancias = distancias_desde(self.robot_pos[robot_id], self.tarea_pickup)
+        filas = np.flatnonzero(distancias <= robot.rango_percepcion)
+        pickup, delivery = self._observar_posiciones(filas)
+        ids = self.ids_tareas[filas].tolist()
+        
+        # Sin ruido, las tareas detectadas son las propias tareas del entorno
+        if self.ruido_percepcion <= 0:
+            return [self.obtener_tarea(tarea_id) for tarea_id in ids]
+        return [self._crear_estimacion(self.obtener_tarea(tarea_id), tuple(p), tuple(d))
+                for tarea_id, p, d in zip(ids, pickup.tolist(), delivery.tolist())]
+    
+    def detectar_tareas_arrays(self) -> Detecciones:
+        """
+        Detecta las tareas en rango de todos los robots y devuelve las observaciones como arrays.
+        
+        Calcula todas las distancias robot-tarea como una matriz y genera el ruido de todas
+        las detecciones con una sola llamada, en el mismo orden (robot y luego tarea) que
+        detectar_tareas, sin construir copias de Tarea.
+        
+        Returns:
+            Detecciones de la ronda, ordenadas por robot y, dentro de cada robot, por fila de tarea
+        """
+        rangos = np.array([robot.rango_percepcion for robot in self.robots])
+        
+        # Misma condición que Robot.puede_detectar_tarea, para todos los pares (robot, tarea)
+        distancias = distancias_manhattan(self.robot_pos, self.tarea_pickup)
+        robots, filas = np.nonzero(distancias <= rangos[:, None])
+        pickup, delivery = self._observar_posiciones(filas)
+        return Detecciones(robots, self.ids_tareas[filas], pickup, delivery)
+    
+    def _posiciones_exactas(self, filas: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Observación sin ruido: las posiciones de recogida y entrega de las filas dadas."""
+        return self.tarea_pickup[filas], self.tarea_delivery[filas]
+    
+    def _posiciones_con_ruido(self, filas: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Observación con ruido gaussiano (el mismo desplazamiento para recogida y entrega)."""
+        ruido = self.rng.normal(0, self.ruido_percepcion, size=(filas.size, 2))
+        pickup = np.rint(self.tarea_real_pickup[filas] + ruido).astype(np.int32)
+        delivery = np.rint(self.tarea_real_delivery[filas] + ruido).astype(np.int32)
+        return pickup, delivery
+    
+    def _crear_estimacion(self,
+                          tarea: Tarea,
+                          pickup_estimado: Tuple[int, int],
+                          delivery_estimado: Tuple[int, int]) -> Tarea:
+        """Crea una copia de la tarea con las posiciones estimadas dadas."""
+        tarea_detectada = Tarea(
+            id_tarea=tarea.id_tarea,
+            posicion_pickup=pickup_estimado,
+            posicion_delivery=delivery_estimado,
+            posicion_real_pickup=tarea.posicion_real_pickup,
+            posicion_real_delivery=tarea.posicion_real_delivery
+        )
+        tarea_detectada.estado = tarea.estado
+        return tarea_detectada
+    
+    def mover_robots(self, robot_ids: List[int], destinos: List[Tuple[int, int]]):
+        """
+        Mueve cada robot dado un paso hacia su destino, calculando todos los pasos a la vez.
+        
+        Equivale a llamar a Robot.mover_hacia para cada robot: el paso en cada eje es el
+        signo de la diferencia con el destino.
+        
+        Args:
+            robot_ids: IDs de los robots a mover
+            destinos: Destino de cada robot, en el mismo orden
+        """
+        if not robot_ids:
+            return
+        
+        actuales = self.robot_pos[robot_ids]
+        pasos = np.sign(np.array(destinos, dtype=np.int32) - actuales)
+        nuevas = (actuales + pasos).tolist()
+        
+        for robot_id, posicion, movido in zip(robot_ids, nuevas, pasos.any(axis=1).tolist()):
+            if movido:
+                robot = self.robots[robot_id]
+                robot.posicion = tuple(posicion)
+                robot.distancia_recorrida += 1
     
     def todas_tareas_completadas(self) -> bool:
         """Verifica si todas las tareas han sido completadas."""
-        return all(t.estado == EstadoTarea.COMPLETADA for t in self.tareas.values())
+        return bool((self.tarea_estado == ESTADO_COMPLETADA).all())
     
     def obtener_estadisticas(self) -> Dict:
         """Obtiene estadísticas del estado actual del entorno."""
         return {
             'ronda': self.ronda_actual,
-            'tareas_completadas': sum(1 for t in self.tareas.values() if t.estado == EstadoTarea.COMPLETADA),
+            'tareas_completadas': int((self.tarea_estado == ESTADO_COMPLETADA).sum()),
             'tareas_totales': len(self.tareas),
-            'distancia_total': sum(r.distancia_recorrida for r in self.robots),
-            'tareas_por_robot': {r.id_robot: r.tareas_completadas_count for r in self.robots}
+            'distancia_total': int(self.robot_distancia.sum()),
+            'tareas_por_robot': dict(zip([r.id_robot for r in self.robots], self.robot_completadas.tolist()))
         }
     
     def avanzar_ronda(self):
         """Avanza una ronda en la simulación."""
         self.ronda_actual += 1
-        stats = self.obtener_estadisticas()
-        self.historial.append(stats)
+        self._actualizar_version_topologia()
+        self._registrar_historial()
+    
+    def _registrar_historial(self):
+        """Guarda las estadísticas de la ronda actual en la siguiente fila del historial."""
+        fila = self._rondas_historial
+        if fila == len(self._historial):
+            # Duplicar la capacidad reservada
+            capacidad = max(1, 2 * fila)
+            self._historial = np.resize(self._historial, capacidad)
+            self._historial_tareas_por_robot = np.resize(self._historial_tareas_por_robot,
+                                                         (capacidad, len(self.robots)))
+        
+        self._historial[fila] = (self.ronda_actual,
+                                 np.count_nonzero(self.tarea_estado == ESTADO_COMPLETADA),
+                                 self.robot_distancia.sum())
+        self._historial_tareas_por_robot[fila] = self.robot_completadas
+        self._rondas_historial = fila + 1
+    
+    def historial_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Devuelve el historial de rondas como matrices, sin construir diccionarios.
+        
+        Returns:
+            Tupla (registros, tareas_por_robot): vector de TIPO_HISTORIAL con una fila por
+            ronda y matriz (rondas x robots) con las tareas completadas por cada robot
+        """
+        n = self._rondas_historial
+        return self._historial[:n], self._historial_tareas_por_robot[:n]
+    
+    @property
+    def historial(self) -> List[Dict]:
+        """Historial de rondas con el formato de obtener_estadisticas (se construye al consultarlo)."""
+        registros, tareas_por_robot = self.historial_arrays()
+        ids = [r.id_robot for r in self.robots]
+        return [{
+            'ronda': ronda,
+            'tareas_completadas': completadas,
+            'tareas_totales': len(self.tareas),
+            'distancia_total': distancia,
+            'tareas_por_robot': dict(zip(ids, por_robot))
+        } for (ronda, completadas, distancia), por_robot in zip(registros.tolist(), tareas_por_robot.tolist())]
+    
+    def _actualizar_version_topologia(self):
+        """Incrementa la versión de la topología si el grafo de comunicación ha podido cambiar."""
+        if (self.probabilidad_fallo_comunicacion > 0
+                or not np.array_equal(self.robot_pos, self._posiciones_topologia)):
+            self.version_topologia += 1
+            np.copyto(self._posiciones_topologia, self.robot_pos)
@@ -0,0 +1,41 @@
+"""
+Funciones para manejar conjuntos de IDs de tareas representados como máscaras de bits.
+"""
+from typing import Iterable, Iterator
+import numpy as np
+
+
+def mascara_de(ids: Iterable[int]) -> int:
+    """Construye la máscara de bits con los IDs dados (bit i activo si el ID i pertenece al conjunto)."""
+    mascara = 0
+    for i in ids:
+        mascara |= 1 << i
+    return mascara
+
+
+def primer_bit(mascara: int) -> int:
+    """Devuelve el menor ID del conjunto (la máscara no debe estar vacía)."""
+    return (mascara & -mascara).bit_length() - 1
+
+
+def iterar_bits(mascara: int) -> Iterator[int]:
+    """Itera los IDs del conjunto representado por la máscara, de menor a mayor."""
+    while mascara:
+        bit = mascara & -mascara
+        yield bit.bit_length() - 1
+        mascara ^= bit
+
+
+def mascara_a_array(mascara: int, n: int) -> np.ndarray:
+    """
+    Convierte la máscara en un array booleano.
+    
+    Args:
+        mascara: Máscara de bits con IDs menores que n
+        n: Longitud del array resultante
+        
+    Returns:
+        Array de n booleanos con la posición i activa si el ID i pertenece al conjunto
+    """
+    octetos = np.frombuffer(mascara.to_bytes((n + 7) // 8, 'little'), dtype=np.uint8)
+    return np.unpackbits(octetos, count=n, bitorder='little').astype(bool)
@@ -1,9 +1,11 @@
 """
 Funciones para calcular métricas de evaluación de los algoritmos.
 """
-from typing import List, Dict
+from typing import List, Dict, Tuple
 import numpy as np
 from utils.entorno import Entorno
+from utils.tarea import ESTADO_COMPLETADA
+from utils.distancias import distancia_manhattan, distancias_por_filas  # distancia_manhattan: exportada por compatibilidad
 
 
 def calcular_metricas(entorno: Entorno, historial: List[Dict] = None) -> Dict:
@@ -23,25 +25,23 @@ def calcular_metricas(entorno: Entorno, historial: List[Dict] = None) -> Dict:
     metricas['rondas_total'] = entorno.ronda_actual
     
     # Distancia total recorrida
-    metricas['distancia_total'] = sum(r.distancia_recorrida for r in entorno.robots)
+    metricas['distancia_total'] = int(entorno.robot_distancia.sum())
     
     # Tasa de completitud
-    tareas_completadas = sum(1 for t in entorno.tareas.values() if t.estado.value == 'completada')
+    tareas_completadas = int((entorno.tarea_estado == ESTADO_COMPLETADA).sum())
     metricas['tasa_completitud'] = tareas_completadas / len(entorno.tareas) if len(entorno.tareas) > 0 else 0.0
     
     # Balance de carga (desviación estándar del número de tareas completadas por robot)
-    tareas_por_robot = [r.tareas_completadas_count for r in entorno.robots]
+    tareas_por_robot = entorno.robot_completadas
     metricas['balance_carga'] = np.std(tareas_por_robot) if len(tareas_por_robot) > 0 else 0.0
     
     # Error de estimación (solo para algoritmo con incertidumbre)
-    errores = []
-    for tarea in entorno.tareas.values():
-        if hasattr(tarea, 'posicion_real_pickup') and tarea.posicion_real_pickup != tarea.posicion_pickup:
-            error_pickup = distancia_manhattan(tarea.posicion_real_pickup, tarea.posicion_pickup)
-            error_delivery = distancia_manhattan(tarea.posicion_real_delivery, tarea.posicion_delivery)
-            errores.append((error_pickup + error_delivery) / 2)
+    # Solo cuentan las tareas cuya recogida estimada difiere de la real
+    error_pickup = distancias_por_filas(entorno.tarea_real_pickup, entorno.tarea_pickup)
+    error_delivery = distancias_por_filas(entorno.tarea_real_delivery, entorno.tarea_delivery)
+    errores = ((error_pickup + error_delivery) / 2)[error_pickup > 0]
     
-    metricas['error_estimacion'] = np.mean(errores) if errores else 0.0
+    metricas['error_estimacion'] = np.mean(errores) if errores.size else 0.0
     
     # Tasa de éxito con incertidumbre
     if historial:
@@ -52,9 +52,19 @@ def calcular_metricas(entorno: Entorno, historial: List[Dict] = None) -> Dict:
     return metricas
 
 
-def distancia_manhattan(pos1: tuple, pos2: tuple) -> int:
-    """Calcula la distancia de Manhattan entre dos posiciones."""
-    return abs(pos1[0] - pos2[0]) + abs(pos1[1] - pos2[1])
+def calcular_estadisticas(resultados: List[Dict]) -> Tuple[Dict[str, float], Dict[str, float]]:
+    """
+    Calcula la media y la desviación estándar de cada métrica sobre varias ejecuciones.
+    
+    Args:
+        resultados: Lista de diccionarios de métricas con las mismas claves
+        
+    Returns:
+        Tupla (promedios, desviaciones), ambos {métrica: valor}
+    """
+    claves = list(resultados[0].keys())
+    valores = np.array([[r[clave] for clave in claves] for r in resultados], dtype=float)  # (ejecuciones, métricas)
+    return dict(zip(claves, valores.mean(axis=0))), dict(zip(claves, valores.std(axis=0)))
 
 
 def imprimir_metricas(metricas: Dict):
@@ -69,3 +79,19 @@ def imprimir_metricas(metricas: Dict):
     if metricas.get('error_estimacion', 0) > 0:
         print(f"Error de estimación promedio: {metricas['error_estimacion']:.2f}")
     print("="*50 + "\n")
+
+
+def imprimir_estado_final(entorno: Entorno, sangria: str = ""):
+    """
+    Imprime el estado final detallado de cada robot y de cada tarea del entorno.
+    
+    Args:
+        entorno: Entorno tras la ejecución del algoritmo
+        sangria: Prefijo de los encabezados (los elementos llevan dos espacios más)
+    """
+    print(f"{sangria}Tareas completadas por robot:")
+    for robot in entorno.robots:
+        print(f"{sangria}  {robot.describir()}: {robot.tareas_completadas_count} tareas")
+    print(f"{sangria}Estado de las tareas:")
+    for tarea in entorno.tareas:
+        print(f"{sangria}  {tarea.describir()}")
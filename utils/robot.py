@@ -1,13 +1,20 @@
 """
 Clase para representar un robot en el sistema multi-robot.
 """
-from typing import Tuple, Set
+from typing import Tuple, Optional
+import numpy as np
 from utils.tarea import Tarea
+from utils.distancias import distancia_manhattan
 
 
 class Robot:
     """Representa un robot en el sistema multi-robot."""
     
+    __slots__ = ('id_robot', '_posiciones', '_fila', '_posicion', 'capacidad', 'carga_actual',
+                 'rango_percepcion', 'rango_comunicacion', 'tareas_conocidas', 'tareas_asignadas',
+                 'tareas_completadas', 'confianza_tareas', 'asignaciones_propuestas',
+                 '_distancias', '_completadas', '_distancia_recorrida', '_tareas_completadas_count')
+    
     def __init__(self,
                  id_robot: int,
                  posicion_inicial: Tuple[int, int],
@@ -25,6 +32,10 @@ class Robot:
             rango_comunicacion: Rango de comunicación (distancia de Manhattan)
         """
         self.id_robot = id_robot
+        
+        # Fila de la matriz de posiciones del entorno que refleja la posición (ver vincular_posicion)
+        self._posiciones: Optional[np.ndarray] = None
+        self._fila = -1
         self.posicion = posicion_inicial
         self.capacidad = capacidad
         self.carga_actual = 0
@@ -32,32 +43,93 @@ class Robot:
         self.rango_comunicacion = rango_comunicacion
         
         # Conjuntos de tareas
-        self.tareas_conocidas: Set[int] = set()  # IDs de tareas conocidas
-        self.tareas_asignadas: Set[int] = set()  # IDs de tareas asignadas
-        self.tareas_completadas: Set[int] = set()  # IDs de tareas completadas
+        self.tareas_conocidas: int = 0  # Máscara de bits de IDs de tareas conocidas
+        self.tareas_asignadas: int = 0  # Máscara de bits de IDs de tareas asignadas
+        self.tareas_completadas: int = 0  # Máscara de bits de IDs de tareas completadas
         
         # Para el algoritmo con incertidumbre
         self.confianza_tareas: dict = {}  # {tarea_id: confianza}
         self.asignaciones_propuestas: dict = {}  # {tarea_id: probabilidad_asignacion}
         
-        # Estadísticas
+        # Estadísticas (reflejadas en los vectores del entorno, ver vincular_estadisticas)
+        self._distancias: Optional[np.ndarray] = None
+        self._completadas: Optional[np.ndarray] = None
         self.distancia_recorrida = 0
         self.tareas_completadas_count = 0
     
-    def distancia_manhattan(self, pos1: Tuple[int, int], pos2: Tuple[int, int]) -> int:
-        """Calcula la distancia de Manhattan entre dos posiciones."""
-        return abs(pos1[0] - pos2[0]) + abs(pos1[1] - pos2[1])
-    
     def puede_detectar_tarea(self, tarea: Tarea) -> bool:
         """Verifica si el robot puede detectar una tarea dentro de su rango de percepción."""
-        dist = self.distancia_manhattan(self.posicion, tarea.posicion_pickup)
+        dist = distancia_manhattan(self.posicion, tarea.posicion_pickup)
         return dist <= self.rango_percepcion
     
     def puede_comunicarse_con(self, otro_robot: 'Robot') -> bool:
         """Verifica si este robot puede comunicarse con otro robot."""
-        dist = self.distancia_manhattan(self.posicion, otro_robot.posicion)
+        dist = distancia_manhattan(self.posicion, otro_robot.posicion)
         return dist <= self.rango_comunicacion
     
+    @property
+    def posicion(self) -> Tuple[int, int]:
+        """Posición actual del robot."""
+        return self._posicion
+    
+    @posicion.setter
+    def posicion(self, valor: Tuple[int, int]):
+        self._posicion = valor
+        if self._posiciones is not None:
+            self._posiciones[self._fila] = valor
+    
+    def vincular_posicion(self, posiciones: np.ndarray, fila: int):
+        """
+        Vincula la posición del robot a una fila de una matriz (n x 2) compartida.
+        
+        A partir de aquí cada cambio de posición se escribe también en esa fila, de modo
+        que la matriz siempre refleja la posición actual sin tener que reconstruirla.
+        
+        Args:
+            posiciones: Matriz de posiciones (una fila por robot)
+            fila: Fila correspondiente a este robot
+        """
+        self._posiciones = posiciones
+        self._fila = fila
+        posiciones[fila] = self._posicion
+    
+    @property
+    def distancia_recorrida(self) -> int:
+        """Distancia total recorrida por el robot."""
+        return self._distancia_recorrida
+    
+    @distancia_recorrida.setter
+    def distancia_recorrida(self, valor: int):
+        self._distancia_recorrida = valor
+        if self._distancias is not None:
+            self._distancias[self._fila] = valor
+    
+    @property
+    def tareas_completadas_count(self) -> int:
+        """Número de tareas completadas por el robot."""
+        return self._tareas_completadas_count
+    
+    @tareas_completadas_count.setter
+    def tareas_completadas_count(self, valor: int):
+        self._tareas_completadas_count = valor
+        if self._completadas is not None:
+            self._completadas[self._fila] = valor
+    
+    def vincular_estadisticas(self, distancias: np.ndarray, completadas: np.ndarray):
+        """
+        Vincula las estadísticas del robot a su posición en dos vectores compartidos.
+        
+        Usa la misma fila que vincular_posicion, que debe haberse llamado antes.
+        
+        Args:
+            distancias: Distancia recorrida por cada robot
+            completadas: Tareas completadas por cada robot
+        """
+        self._distancias = distancias
+        self._completadas = completadas
+        distancias[self._fila] = self._distancia_recorrida
+        completadas[self._fila] = self._tareas_completadas_count
+    
     def tiene_capacidad(self) -> bool:
         """Verifica si el robot tiene capacidad disponible."""
         return self.carga_actual < self.capacidad
@@ -85,13 +157,12 @@ class Robot:
     
     def asignar_tarea(self, tarea_id: int):
         """Asigna una tarea al robot."""
-        self.tareas_asignadas.add(tarea_id)
+        self.tareas_asignadas |= 1 << tarea_id
     
     def completar_tarea(self, tarea_id: int):
         """Marca una tarea como completada."""
-        if tarea_id in self.tareas_asignadas:
-            self.tareas_asignadas.remove(tarea_id)
-        self.tareas_completadas.add(tarea_id)
+        self.tareas_asignadas &= ~(1 << tarea_id)
+        self.tareas_completadas |= 1 << tarea_id
         self.tareas_completadas_count += 1
         self.carga_actual = max(0, self.carga_actual - 1)
     
@@ -100,5 +171,9 @@ class Robot:
         if self.carga_actual < self.capacidad:
             self.carga_actual += 1
     
-    def __repr__(self):
+    def describir(self) -> str:
+        """Devuelve una descripción completa del robot (posición y carga)."""
         return f"Robot(id={self.id_robot}, pos={self.posicion}, carga={self.carga_actual}/{self.capacidad})"
+    
+    def __repr__(self):
+        return f"Robot({self.id_robot})"
@@ -2,7 +2,20 @@
 Clase para representar una tarea de recogida y entrega.
 """
 from enum import Enum
-from typing import Tuple, Optional
+from functools import lru_cache
+from typing import Tuple, Optional, Sequence
+
+import numpy as np
+
+from utils.distancias import distancia_manhattan
+
+
+@lru_cache(maxsize=1 << 16)
+def _coste_total(posicion_robot: Tuple[int, int],
+                 posicion_pickup: Tuple[int, int],
+                 posicion_delivery: Tuple[int, int]) -> int:
+    """Distancia robot -> pickup -> delivery, memorizada por tupla de posiciones."""
+    return distancia_manhattan(posicion_robot, posicion_pickup) + distancia_manhattan(posicion_pickup, posicion_delivery)
 
 
 class EstadoTarea(Enum):
@@ -13,9 +26,23 @@ class EstadoTarea(Enum):
     COMPLETADA = "completada"
 
 
+# Códigos enteros de los estados, en el orden de EstadoTarea, para guardarlos en matrices int8
+ESTADO_PENDIENTE = 0
+ESTADO_ASIGNADA = 1
+ESTADO_EN_PROGRESO = 2
+ESTADO_COMPLETADA = 3
+_ESTADOS = tuple(EstadoTarea)
+_CODIGOS_ESTADO = {estado: codigo for codigo, estado in enumerate(_ESTADOS)}
+
+
 class Tarea:
     """Representa una tarea de recogida y entrega."""
     
+    __slots__ = ('id_tarea', '_pickups', '_deliveries', '_estados', '_fila', '_fila_estado',
+                 '_posicion_pickup', '_posicion_delivery', 'posicion_real_pickup', 'posicion_real_delivery',
+                 '_codigo_estado', 'robot_asignado', 'estimaciones', 'sigma_pickup', 'sigma_delivery',
+                 'confianza_total', 'suma_fusion', '_compensacion_fusion')
+    
     def __init__(self, 
                  id_tarea: int,
                  posicion_pickup: Tuple[int, int],
@@ -33,6 +60,13 @@ class Tarea:
             posicion_real_delivery: Posición real de entrega (si es None, usa posicion_delivery)
         """
         self.id_tarea = id_tarea
+        
+        # Filas de las matrices del entorno que reflejan las posiciones estimadas (ver vincular_posiciones)
+        self._pickups: Optional[np.ndarray] = None
+        self._deliveries: Optional[np.ndarray] = None
+        self._estados: Optional[np.ndarray] = None
+        self._fila = -1
+        self._fila_estado = -1
         self.posicion_pickup = posicion_pickup
         self.posicion_delivery = posicion_delivery
         self.posicion_real_pickup = posicion_real_pickup if posicion_real_pickup else posicion_pickup
@@ -45,10 +79,114 @@ class Tarea:
         self.sigma_pickup = 0.0
         self.sigma_delivery = 0.0
         self.confianza_total = 0.0
+        
+        # Fusión incremental: suma ponderada de [pickup_x, pickup_y, delivery_x, delivery_y, sigma]
+        # y suma de pesos, en float32 con compensación de Kahan para que sumar y restar
+        # estimaciones durante muchas rondas no acumule error de redondeo
+        self.suma_fusion = np.zeros(6, dtype=np.float32)
+        self._compensacion_fusion = np.zeros(6, dtype=np.float32)
+    
+    @property
+    def posicion_pickup(self) -> Tuple[int, int]:
+        """Posición de recogida (puede ser estimada)."""
+        return self._posicion_pickup
+    
+    @posicion_pickup.setter
+    def posicion_pickup(self, valor: Tuple[int, int]):
+        self._posicion_pickup = valor
+        if self._pickups is not None:
+            self._pickups[self._fila] = valor
+    
+    @property
+    def posicion_delivery(self) -> Tuple[int, int]:
+        """Posición de entrega (puede ser estimada)."""
+        return self._posicion_delivery
+    
+    @posicion_delivery.setter
+    def posicion_delivery(self, valor: Tuple[int, int]):
+        self._posicion_delivery = valor
+        if self._deliveries is not None:
+            self._deliveries[self._fila] = valor
+    
+    @property
+    def estado(self) -> EstadoTarea:
+        """Estado actual de la tarea."""
+        return _ESTADOS[self._codigo_estado]
+    
+    @estado.setter
+    def estado(self, valor: EstadoTarea):
+        self._codigo_estado = _CODIGOS_ESTADO[valor]
+        if self._estados is not None:
+            self._estados[self._fila_estado] = self._codigo_estado
+    
+    def vincular_estado(self, estados: np.ndarray, fila: int):
+        """
+        Vincula el estado de la tarea a una posición de un vector de códigos compartido.
+        
+        A partir de aquí cada cambio de estado se escribe también (como ESTADO_*) en esa posición.
+        
+        Args:
+            estados: Vector de códigos de estado (uno por tarea)
+            fila: Posición correspondiente a esta tarea
+        """
+        self._estados = estados
+        self._fila_estado = fila
+        estados[fila] = self._codigo_estado
+    
+    def vincular_posiciones(self, pickups: np.ndarray, deliveries: np.ndarray, fila: int):
+        """
+        Vincula las posiciones estimadas de la tarea a una fila de dos matrices (n x 2) compartidas.
+        
+        A partir de aquí cada cambio de posición se escribe también en esas filas.
+        
+        Args:
+            pickups: Matriz de posiciones de recogida (una fila por tarea)
+            deliveries: Matriz de posiciones de entrega (una fila por tarea)
+            fila: Fila correspondiente a esta tarea
+        """
+        self._pickups = pickups
+        self._deliveries = deliveries
+        self._fila = fila
+        pickups[fila] = self._posicion_pickup
+        deliveries[fila] = self._posicion_delivery
+    
+    def reiniciar_fusion(self):
+        """Descarta las estimaciones acumuladas en la fusión incremental."""
+        self.suma_fusion = np.zeros(6, dtype=np.float32)
+        self._compensacion_fusion = np.zeros(6, dtype=np.float32)
+        self.confianza_total = 0.0
     
-    def distancia_manhattan(self, pos1: Tuple[int, int], pos2: Tuple[int, int]) -> int:
-        """Calcula la distancia de Manhattan entre dos posiciones."""
-        return abs(pos1[0] - pos2[0]) + abs(pos1[1] - pos2[1])
+    def incorporar_suma(self, suma_ponderada: Sequence[float], peso: float):
+        """
+        Actualiza la fusión con un bloque de estimaciones ya ponderadas, en O(1).
+        
+        Args:
+            suma_ponderada: Suma de confianza * (pickup_x, pickup_y, delivery_x, delivery_y, sigma)
+                de las estimaciones nuevas menos la de las que reemplazan
+            peso: Variación correspondiente de la confianza total
+        """
+        self._sumar_compensado(np.array((*suma_ponderada, peso), dtype=np.float32))
+    
+    def _sumar_compensado(self, incremento: np.ndarray):
+        """Suma un vector de 6 componentes a los acumuladores (valores ponderados y peso total)."""
+        # Suma compensada de Kahan: c guarda la parte perdida en el redondeo de la suma anterior
+        y = incremento - self._compensacion_fusion
+        t = self.suma_fusion + y
+        self._compensacion_fusion = (t - self.suma_fusion) - y
+        self.suma_fusion = t
+        self.confianza_total = float(t[5])
+    
+    def aplicar_fusion(self):
+        """Actualiza las posiciones estimadas y la incertidumbre con la fusión acumulada."""
+        if self.confianza_total <= 0:
+            return
+        
+        # Solo se convierte a entero al escribir las posiciones estimadas
+        fusion = (self.suma_fusion[:5] / self.suma_fusion[5]).tolist()
+        self.posicion_pickup = (int(round(fusion[0])), int(round(fusion[1])))
+        self.posicion_delivery = (int(round(fusion[2])), int(round(fusion[3])))
+        self.sigma_pickup = fusion[4]
+        self.sigma_delivery = fusion[4]
     
     def coste_total(self, posicion_robot: Tuple[int, int]) -> float:
         """
@@ -60,9 +198,11 @@ class Tarea:
         Returns:
             Distancia total a recorrer
         """
-        dist_pickup = self.distancia_manhattan(posicion_robot, self.posicion_pickup)
-        dist_delivery = self.distancia_manhattan(self.posicion_pickup, self.posicion_delivery)
-        return dist_pickup + dist_delivery
+        return _coste_total(tuple(posicion_robot), self.posicion_pickup, self.posicion_delivery)
     
-    def __repr__(self):
+    def describir(self) -> str:
+        """Devuelve una descripción completa de la tarea (estado y posiciones)."""
         return f"Tarea(id={self.id_tarea}, estado={self.estado.value}, pickup={self.posicion_pickup}, delivery={self.posicion_delivery})"
+    
+    def __repr__(self):
+        return f"Tarea({self.id_tarea})"